@@ -2,20 +2,30 @@ import asyncio
 import datetime
 import logging
 import os
+from functools import partial
 
 from aiogram import Bot, Dispatcher
 from aiogram.contrib.fsm_storage.redis import RedisStorage2
 from aioredis import Redis
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from yookassa import Configuration
 
 from tgbot.config import load_config
 from tgbot import handlers
 from tgbot import filters
 from tgbot import middlewares
-from tgbot.services.database.base import Base
+from tgbot.services.database.schema import create_schema
+from tgbot.services.broadcasters.jobs import BroadcastWorker
+from tgbot.services.cart_buffer import QuantityBuffer
+from tgbot.services.delivery_zones import DeliveryZoneResolver
 from tgbot.services.iiko.api import Iiko
+from tgbot.services.image_cache import ImageCache
+from tgbot.services.menu import MenuSynchronizer, ImagePrewarmer
+from tgbot.services.order_tracker import OrderTracker
+from tgbot.services.outbox import OutboxWorker
+from tgbot.services.reservations import ReservationPlanner, TableLayoutCache
+from tgbot.services.yookassa.api import YooKassa
+from tgbot.services.yookassa.webhook import YooKassaWebhook
 
 logger = logging.getLogger(__name__)
 
@@ -65,27 +75,78 @@ async def main():
         future=True
     )
     async_sessionmaker = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession, future=True)
+    await create_schema(engine)
 
-    iiko = Iiko(config.iiko.login, config.iiko.default_organization_id)
+    iiko = Iiko(config.iiko.login, config.iiko.default_organization_id, redis=redis)
+    iiko.token_manager.start()
 
-    Configuration.account_id = config.yookassa.store_id
-    Configuration.secret_key = config.yookassa.secret_key
+    image_cache = ImageCache(redis, config.misc.image_cache_dir)
+    prewarmer = None
+    if config.bot.service_chat_id:
+        prewarmer = ImagePrewarmer(bot, redis, config.bot.service_chat_id, image_cache=image_cache)
+    menu = MenuSynchronizer(iiko, redis, async_sessionmaker, config.iiko.menu_sync_interval, prewarmer)
+    await menu.load()
+    menu.start()
+
+    delivery_zones = DeliveryZoneResolver(iiko, redis)
+    table_layouts = TableLayoutCache(iiko)
+    table_layouts.start()
+    reservations = ReservationPlanner(iiko, table_layouts)
+
+    yookassa = YooKassa(config.yookassa.store_id, config.yookassa.secret_key)
+
+    order_tracker = OrderTracker(iiko, redis, bot)
+    order_tracker.start()
+    outbox_worker = OutboxWorker(iiko, async_sessionmaker, bot, config.bot.admin_ids, tracker=order_tracker)
+    outbox_worker.start()
 
     bot['config'] = config
     bot['redis'] = redis
     bot['database'] = async_sessionmaker
     bot['iiko'] = iiko
+    bot['yookassa'] = yookassa
+    bot['delivery_zones'] = delivery_zones
+    bot['reservations'] = reservations
+    bot['menu'] = menu
+    bot['image_cache'] = image_cache
+    bot['cart_buffer'] = QuantityBuffer()
+
+    broadcast_worker = BroadcastWorker(bot, redis, async_sessionmaker)
+    broadcast_worker.start()
 
     register_all_middlewares(dp, config)
     register_all_filters(dp)
     register_all_handlers(dp)
 
+    yookassa_webhook = None
+    if config.yookassa.webhook_port:
+        yookassa_webhook = YooKassaWebhook(
+            yookassa,
+            partial(handlers.order.process_payment_notification, dp),
+            config.yookassa.webhook_host,
+            config.yookassa.webhook_port,
+            config.yookassa.webhook_path
+        )
+        await yookassa_webhook.start()
+
     try:
         await dp.start_polling()
     finally:
         await dp.storage.close()
         await dp.storage.wait_closed()
 
+        if yookassa_webhook:
+            await yookassa_webhook.close()
+        await bot['cart_buffer'].close()
+        await outbox_worker.close()
+        await broadcast_worker.close()
+        await order_tracker.close()
+        await table_layouts.close()
+        await menu.close()
+        await iiko.close()
+        await image_cache.close()
+        await yookassa.close()
+
         bot_session = await bot.get_session()
         await bot_session.close()
 
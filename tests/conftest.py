@@ -0,0 +1,100 @@
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+from tgbot.services.iiko.schemas import DeliveryRestrictionsResult, SuitableTerminalGroupsResult
+
+ORGANIZATION_ID = '7a0b1c3e-5d7f-4e2a-9b1c-0d2e3f4a5b6c'
+TERMINAL_GROUP_ID = '1f2e3d4c-5b6a-4978-8695-a4b3c2d1e0f9'
+
+
+class FakeRedis:
+    """Keeps values in a dict, only the commands used by the services under test"""
+
+    def __init__(self):
+        self.data = dict()
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+
+        self.data[key] = value if isinstance(value, bytes) else str(value).encode()
+        return True
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def hincrby(self, key, field, amount=1):
+        fields = self.data.setdefault(key, dict())
+        fields[field] = int(fields.get(field, 0)) + amount
+        return fields[field]
+
+    async def hmget(self, key, *fields):
+        values = self.data.get(key, dict())
+        return [str(values[field]).encode() if field in values else None for field in fields]
+
+    async def scard(self, key):
+        return len(self.data.get(key, ()))
+
+
+class FakeIiko:
+    """Returns the same delivery zones with a new correlationId on every request and counts requests"""
+
+    def __init__(self):
+        self.zones = [
+            {'name': 'Центр', 'coordinates': [
+                {'latitude': 55.0, 'longitude': 37.0},
+                {'latitude': 55.0, 'longitude': 38.0},
+                {'latitude': 56.0, 'longitude': 38.0},
+                {'latitude': 56.0, 'longitude': 37.0}
+            ]}
+        ]
+        self.restrictions_requests = 0
+        self.suitability_requests = 0
+        self._correlation_ids = itertools.count()
+
+    async def get_organizations(self, extended_info, include_disabled):
+        return SimpleNamespace(organizations=[SimpleNamespace(id=ORGANIZATION_ID)])
+
+    async def get_delivery_restrictions(self, organization_ids):
+        self.restrictions_requests += 1
+        return DeliveryRestrictionsResult(
+            correlationId=f'correlation-{next(self._correlation_ids)}',
+            deliveryRestrictions=[{
+                'organizationId': ORGANIZATION_ID,
+                'restrictions': [{
+                    'minSum': 1000,
+                    'terminalGroupId': TERMINAL_GROUP_ID,
+                    'organizationId': ORGANIZATION_ID,
+                    'zone': 'Центр',
+                    'deliveryDurationInMinutes': 60
+                }],
+                'deliveryZones': self.zones
+            }]
+        )
+
+    async def get_terminal_groups_for_delivery(self, request):
+        self.suitability_requests += 1
+        return SuitableTerminalGroupsResult(correlationId='suitability', isAllowed=False,
+                                            allowedItems=[], rejectedItems=[])
+
+
+def expire_restrictions(resolver, redis: FakeRedis):
+    """Same as the restrictions TTL running out in redis and in the resolver"""
+    redis.data.pop('delivery:restrictions', None)
+    resolver._expires_at = 0
+
+
+@pytest.fixture
+def redis():
+    return FakeRedis()
+
+
+@pytest.fixture
+def iiko():
+    return FakeIiko()
@@ -0,0 +1,44 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+from tgbot.services.broadcasters.jobs import BroadcastWorker
+from tgbot.services.database.models import BroadcastJob, TelegramUser
+
+
+class FakeDatabase:
+    def __init__(self, job: BroadcastJob):
+        self.session = MagicMock()
+        self.session.get = AsyncMock(return_value=job)
+        self.session.commit = AsyncMock()
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self.session
+
+    async def __aexit__(self, *args):
+        pass
+
+
+def test_failing_job_is_stopped_after_max_errors(redis, monkeypatch):
+    job = BroadcastJob(id=1, status='pending', message={}, created_by=42, sent=0, failed=0)
+    monkeypatch.setattr(BroadcastJob, 'get_next',
+                        AsyncMock(side_effect=lambda session: job if job.status in ('pending', 'running') else None))
+    monkeypatch.setattr(TelegramUser, 'count_audience', AsyncMock(return_value=10))
+    bot = MagicMock()
+    bot.send_message = AsyncMock()
+    worker = BroadcastWorker(bot, redis, FakeDatabase(job), max_errors=3)
+    monkeypatch.setattr(worker, '_run', AsyncMock(side_effect=TypeError("This type of message can't be copied.")))
+
+    async def process_all():
+        return [await worker.process() for _ in range(4)]
+
+    results = asyncio.run(process_all())
+
+    assert results == [False, False, False, False]
+    assert worker._run.await_count == 3
+    assert job.status == 'failed'
+    assert job.finished_at is not None
+    bot.send_message.assert_awaited_once()
+    assert bot.send_message.await_args.args[0] == 42
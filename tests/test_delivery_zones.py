@@ -0,0 +1,27 @@
+import asyncio
+
+from tgbot.services.delivery_zones import DeliveryZoneResolver
+from tests.conftest import expire_restrictions
+
+
+def test_version_ignores_correlation_id(iiko, redis):
+    resolver = DeliveryZoneResolver(iiko, redis)
+
+    first_version = asyncio.run(resolver.get_version())
+    expire_restrictions(resolver, redis)
+    second_version = asyncio.run(resolver.get_version())
+
+    assert iiko.restrictions_requests == 2
+    assert first_version is not None
+    assert first_version == second_version
+
+
+def test_version_changes_with_zones(iiko, redis):
+    resolver = DeliveryZoneResolver(iiko, redis)
+
+    first_version = asyncio.run(resolver.get_version())
+    iiko.zones[0]['coordinates'][0] = {'latitude': 54.9, 'longitude': 37.0}
+    expire_restrictions(resolver, redis)
+    second_version = asyncio.run(resolver.get_version())
+
+    assert first_version != second_version
@@ -0,0 +1,29 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+from tgbot.services.database.models import OrderOutbox
+from tgbot.services.outbox import OutboxWorker
+from tests.conftest import ORGANIZATION_ID
+
+ORDER_ID = '3c4d5e6f-7a8b-4c9d-8e0f-1a2b3c4d5e6f'
+
+
+def test_tracking_failure_does_not_resubmit_order():
+    iiko = MagicMock()
+    iiko.create_delivery = AsyncMock()
+    tracker = MagicMock()
+    tracker.track = AsyncMock(side_effect=ConnectionError('redis is down'))
+    worker = OutboxWorker(iiko, database=None, tracker=tracker)
+    record = OrderOutbox(
+        id=1, kind='delivery', telegram_id=1, attempts=0, status='pending',
+        payload={'organizationId': ORGANIZATION_ID,
+                 'order': {'id': ORDER_ID, 'phone': '+79990000000', 'items': [], 'payments': []}}
+    )
+
+    is_sent = asyncio.run(worker._submit(record))
+
+    assert is_sent
+    assert record.status == 'sent'
+    assert record.last_error is None
+    iiko.create_delivery.assert_awaited_once()
+    tracker.track.assert_awaited_once_with(ORGANIZATION_ID, ORDER_ID, 1)
@@ -0,0 +1,50 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+from tgbot.handlers import order
+from tgbot.services.database.models import SavedAddress, Cart
+from tgbot.services.delivery_zones import DeliveryZoneResolver
+from tests.conftest import ORGANIZATION_ID, TERMINAL_GROUP_ID, expire_restrictions
+
+
+class FakeDatabase:
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return MagicMock()
+
+    async def __aexit__(self, *args):
+        pass
+
+
+def test_saved_address_survives_refetch_of_same_zones(iiko, redis, monkeypatch):
+    resolver = DeliveryZoneResolver(iiko, redis)
+    saved_address = SavedAddress(
+        id=1, city='Москва', street='Тверская', house='1', flat='10',
+        organization_id=ORGANIZATION_ID, terminal_group_id=TERMINAL_GROUP_ID,
+        checked_sum=1500, restrictions_version=asyncio.run(resolver.get_version())
+    )
+    expire_restrictions(resolver, redis)
+
+    monkeypatch.setattr(SavedAddress, 'get_user_address', AsyncMock(return_value=saved_address))
+    monkeypatch.setattr(Cart, 'get_user_cart', AsyncMock(return_value=SimpleNamespace(total_sum=2000)))
+    monkeypatch.setattr(order.states.Order.finishing, 'set', AsyncMock())
+
+    services = {'delivery_zones': resolver, 'database': FakeDatabase()}
+    call = MagicMock()
+    call.bot.get.side_effect = services.get
+    call.from_user.id = 1
+    call.answer = AsyncMock()
+    call.message.answer = AsyncMock()
+    call.message.delete = AsyncMock()
+    state = AsyncMock()
+
+    asyncio.run(order.choose_saved_address(call, {'id': '1'}, state))
+
+    assert iiko.restrictions_requests == 2
+    assert iiko.suitability_requests == 0
+    state.update_data.assert_awaited_once()
+    assert state.update_data.await_args.kwargs['organization'] == ORGANIZATION_ID
+    assert state.update_data.await_args.kwargs['restrictions_version'] == saved_address.restrictions_version
@@ -15,11 +15,13 @@ class TelegramBot:
     token: str
     admin_ids: list[int]
     write_logs: bool
+    service_chat_id: int | None
 
 
 @dataclass
 class Miscellaneous:
     feedback_url: str
+    image_cache_dir: str
 
 
 @dataclass
@@ -36,6 +38,7 @@ class IikoConfig:
     login: str
     default_organization_id: str
     map_url: str
+    menu_sync_interval: int
     payments: IikoPayments
 
 
@@ -44,6 +47,9 @@ class YooKassa:
     secret_key: str
     store_id: str
     redirect_url: str
+    webhook_host: str
+    webhook_port: int | None
+    webhook_path: str
 
 
 @dataclass
@@ -64,6 +70,7 @@ def load_config(path: str = None):
             token=env.str('BOT_TOKEN'),
             admin_ids=list(map(int, env.list('ADMINS'))),
             write_logs=env.bool('WRITE_LOGS'),
+            service_chat_id=env.int('SERVICE_CHAT_ID', None),
         ),
         database=DatabaseConfig(
             password=env.str('POSTGRES_PASSWORD'),
@@ -72,12 +79,14 @@ def load_config(path: str = None):
         ),
         misc=Miscellaneous(
             feedback_url=env.str('FEEDBACK_URL'),
+            image_cache_dir=env.str('IMAGE_CACHE_DIR', 'image_cache'),
 
         ),
         iiko=IikoConfig(
             login=env.str('IIKO_LOGIN'),
             default_organization_id=env.str('DEFAULT_ORGANIZATION'),
             map_url=env.str('MAP_URL'),
+            menu_sync_interval=env.int('MENU_SYNC_INTERVAL', 300),
             payments=IikoPayments(
                 cash=env.str('CASH'),
                 courier=env.str('COURIER'),
@@ -89,6 +98,9 @@ def load_config(path: str = None):
         yookassa=YooKassa(
             secret_key=env.str('YOOKASSA_KEY'),
             store_id=env.str('YOOKASSA_STORE_ID'),
-            redirect_url=env.str('REDIRECT_URL')
+            redirect_url=env.str('REDIRECT_URL'),
+            webhook_host=env.str('YOOKASSA_WEBHOOK_HOST', '0.0.0.0'),
+            webhook_port=env.int('YOOKASSA_WEBHOOK_PORT', None),
+            webhook_path=env.str('YOOKASSA_WEBHOOK_PATH', '/yookassa')
         )
     )
@@ -1,20 +1,28 @@
 from aiogram import Dispatcher
 from aiogram.dispatcher import FSMContext
-from aiogram.types import Message, MediaGroup, ContentType
+from aiogram.types import Message, ContentType
 
 from tgbot.keyboards import reply_keyboards
 from tgbot.misc import states
-from tgbot.services.broadcasters.message_with_media_group import MessageBroadcasterWithMediaGroup
-from tgbot.services.database.models import TelegramUser
+from tgbot.services.broadcasters.jobs import get_progress
+from tgbot.services.database.models import TelegramUser, BroadcastJob
 
 
-async def start_mailing(message: Message):
+async def check_admin(message: Message) -> bool:
     db = message.bot.get('database')
     async with db() as session:
         tg_user = await session.get(TelegramUser, message.from_id)
-        if not tg_user.is_admin:
-            await message.answer('Вы не админ!')
-            return
+
+    if not tg_user or not tg_user.is_admin:
+        await message.answer('Вы не админ!')
+        return False
+
+    return True
+
+
+async def start_mailing(message: Message):
+    if not await check_admin(message):
+        return
 
     await message.answer('Отправьте сообщение для рассылки.\nОно будет отправлено всем пользователям бота',
                          reply_markup=reply_keyboards.cancel)
@@ -22,12 +30,6 @@ async def start_mailing(message: Message):
 
 
 async def get_message(message: Message, state: FSMContext, album: list[Message]):
-    db = message.bot.get('database')
-    async with db() as session:
-        telegram_users = await TelegramUser.get_all(session)
-
-    telegram_ids = [tg_user.telegram_id for tg_user in telegram_users]
-
     if album:
         medias = []
         caption = ''
@@ -42,21 +44,81 @@ async def get_message(message: Message, state: FSMContext, album: list[Message])
             medias.append({"media": file_id, "type": obj.content_type})
 
         medias[0]['caption'] = caption
-        media_group = MediaGroup()
-        media_group.attach_many(*medias)
     else:
-        media_group = None
+        medias = None
 
-    await MessageBroadcasterWithMediaGroup(
-        chats=telegram_ids,
-        message=message,
-        media_group=media_group
-    ).run()
+    db = message.bot.get('database')
+    async with db() as session:
+        job = BroadcastJob(message=message.to_python(), media_group=medias, created_by=message.from_id)
+        session.add(job)
+        await session.commit()
 
-    await message.answer('Сообщение разослано!', reply_markup=reply_keyboards.main_menu)
+    await message.answer(f'Рассылка #{job.id} поставлена в очередь.\n'
+                         f'Прогресс: /mailings, управление: /mailing_pause, /mailing_resume, /mailing_cancel',
+                         reply_markup=reply_keyboards.main_menu)
     await state.finish()
 
 
+async def show_mailings(message: Message):
+    if not await check_admin(message):
+        return
+
+    redis = message.bot.get('redis')
+    db = message.bot.get('database')
+    async with db() as session:
+        jobs = await BroadcastJob.get_last(session)
+
+    if not jobs:
+        await message.answer('Рассылок ещё не было')
+        return
+
+    lines = []
+    for job in jobs:
+        progress = await get_progress(redis, job)
+        lines.append(f'#{job.id} {job.created_at:%d.%m %H:%M} — {job.status}: '
+                     f'{progress["sent"]} отправлено, {progress["failed"]} ошибок из {progress["total"] or "?"}')
+
+    await message.answer('\n'.join(lines))
+
+
+async def change_mailing_status(message: Message, allowed: tuple[str, ...], status: str):
+    if not await check_admin(message):
+        return
+
+    job_id = message.get_args()
+    if not job_id.isdigit():
+        await message.answer(f'Укажите номер рассылки, например: /{message.get_command(pure=True)} 5')
+        return
+
+    db = message.bot.get('database')
+    async with db() as session:
+        job = await session.get(BroadcastJob, int(job_id))
+        if job is None or job.status not in allowed:
+            await message.answer('Рассылка не найдена или уже в этом состоянии')
+            return
+
+        job.status = status
+        await session.commit()
+
+    await message.answer(f'Рассылка #{job.id}: {status}')
+
+
+async def pause_mailing(message: Message):
+    await change_mailing_status(message, ('pending', 'running'), 'paused')
+
+
+async def resume_mailing(message: Message):
+    await change_mailing_status(message, ('paused',), 'pending')
+
+
+async def cancel_mailing(message: Message):
+    await change_mailing_status(message, ('pending', 'running', 'paused'), 'cancelled')
+
+
 def register_admin(dp: Dispatcher):
     dp.register_message_handler(start_mailing, commands=['post', 'mail', 'mailing'])
+    dp.register_message_handler(show_mailings, commands=['mailings'])
+    dp.register_message_handler(pause_mailing, commands=['mailing_pause'])
+    dp.register_message_handler(resume_mailing, commands=['mailing_resume'])
+    dp.register_message_handler(cancel_mailing, commands=['mailing_cancel'])
     dp.register_message_handler(get_message, state=states.Mailing.waiting_for_message, content_types=[ContentType.ANY])
@@ -1,141 +1,100 @@
 import datetime
 
 from aiogram import Dispatcher
-from aiogram.types import Message, CallbackQuery, InputFile, InputMediaPhoto
+from aiogram.types import Message, CallbackQuery
+from aiogram.utils.exceptions import MessageNotModified
 
 from tgbot.keyboards import inline_keyboards
 from tgbot.misc import messages, callbacks
-from tgbot.services.database.models import TelegramUser, Cart, IikoUser
+from tgbot.services.database.models import Cart, CartContents
 from tgbot.services.utils import update_message_content
 
 
-async def show_cart_product(call: CallbackQuery, callback_data: dict):
-    db = call.bot.get('database')
-    async with db() as session:
-        current_product = await session.get(Cart, int(callback_data['id']))
-        if not current_product:
-            await call.answer(messages.request_new_cart, show_alert=True)
-            return
-        await session.refresh(current_product, ['iiko_user'])
-        await session.refresh(current_product.iiko_user, ['cart_products'])
-
-        total_sum = 0
-        for ind, cart_product in enumerate(current_product.iiko_user.cart_products):
-            await session.refresh(cart_product, ['product'])
-            if current_product.id == cart_product.id:
-                product_num = ind + 1
-            total_sum += cart_product.quantity * cart_product.product.price
-
-        text = messages.product.format(
-            name=current_product.product.name,
-            price=current_product.product.price,
-            description=current_product.product.description
-        )
-        keyboard = inline_keyboards.get_cart_keyboard(current_product.iiko_user.cart_products, current_product.product,
-                                                      product_num, total_sum)
+async def show_cart(call: CallbackQuery, cart: CartContents):
+    current_product = cart.current
+    text = messages.product.format(
+        name=current_product.product.name,
+        price=current_product.product.price,
+        description=current_product.product.description
+    )
+    keyboard = inline_keyboards.get_cart_keyboard(cart.lines, current_product.product, cart.position, cart.total_sum)
 
     redis = call.bot.get('redis')
     await update_message_content(call, redis, text, keyboard, current_product.product.image_link)
 
-    await call.answer()
-
 
-async def add_quantity(call: CallbackQuery, callback_data: dict):
-    db = call.bot.get('database')
+async def show_first_or_empty_cart(call: CallbackQuery, cart: CartContents):
+    if not cart.lines:
+        await call.message.delete()
+        await call.message.answer(messages.empty_cart, reply_markup=inline_keyboards.open_menu)
+        return
 
-    async with db() as session:
-        cart_product = await session.get(Cart, int(callback_data['id']))
-        if not cart_product:
-            await call.answer(messages.request_new_cart, show_alert=True)
-            return
-        cart_product.quantity += 1
-        await session.refresh(cart_product, ['iiko_user'])
-        iiko_user = cart_product.iiko_user
-        await session.refresh(iiko_user, ['cart_products'])
-        await session.commit()
+    cart.position = 1
+    await show_cart(call, cart)
 
-        total_sum = 0
-        for ind, product in enumerate(iiko_user.cart_products):
-            await session.refresh(product, ['product'])
-            if product.id == int(callback_data['id']):
-                product_num = ind + 1
 
-            total_sum += product.quantity * product.product.price
+async def show_cart_product(call: CallbackQuery, callback_data: dict):
+    db = call.bot.get('database')
+    async with db() as session:
+        cart = await Cart.get_user_cart(session, call.from_user.id, int(callback_data['id']))
 
-        await call.message.edit_reply_markup(inline_keyboards.get_cart_keyboard(
-            iiko_user.cart_products,
-            cart_product.product,
-            product_num,
-            total_sum
-        ))
+    if not cart.current:
+        await call.answer(messages.request_new_cart, show_alert=True)
+        return
 
+    await show_cart(call, cart)
     await call.answer()
 
 
-async def reduce_quantity(call: CallbackQuery, callback_data: dict):
-    db = call.bot.get('database')
+async def change_quantity(call: CallbackQuery, cart_id: int, delta: int):
+    async def apply(total_delta: int):
+        db = call.bot.get('database')
+        async with db() as session:
+            quantity = await Cart.change_quantity(session, cart_id, total_delta)
+            await session.commit()
 
-    async with db() as session:
-        cart_product = await session.get(Cart, int(callback_data['id']))
-        if not cart_product:
-            await call.answer(messages.request_new_cart, show_alert=True)
-            return
-        cart_product.quantity -= 1
-        await session.refresh(cart_product, ['iiko_user'])
-        iiko_user = cart_product.iiko_user
-        await session.commit()
-        await session.refresh(iiko_user, ['cart_products'])
+            cart = await Cart.get_user_cart(session, call.from_user.id, cart_id)
 
-        if cart_product.quantity == 0:
-            await session.delete(cart_product)
-            await session.commit()
-            if len(iiko_user.cart_products) == 1:
-                await call.message.delete()
-                await call.message.answer(messages.empty_cart, reply_markup=inline_keyboards.open_menu)
-                await call.answer()
-            else:
-                await session.refresh(iiko_user, ['cart_products'])
-                await show_cart_product(call, callback_data={'id': iiko_user.cart_products[0].id})
+        if quantity is None or quantity <= 0:
+            await show_first_or_empty_cart(call, cart)
             return
 
-        total_sum = 0
-        for ind, product in enumerate(iiko_user.cart_products):
-            await session.refresh(product, ['product'])
-            if product.id == int(callback_data['id']):
-                product_num = ind + 1
+        try:
+            await call.message.edit_reply_markup(inline_keyboards.get_cart_keyboard(
+                cart.lines,
+                cart.current.product,
+                cart.position,
+                cart.total_sum
+            ))
+        except MessageNotModified:
+            pass
+
+    cart_buffer = call.bot.get('cart_buffer')
+    cart_buffer.add((call.from_user.id, 'cart', cart_id), delta, apply)
+    await call.answer()
 
-            total_sum += product.quantity * product.product.price
 
-        await call.message.edit_reply_markup(inline_keyboards.get_cart_keyboard(
-            iiko_user.cart_products,
-            cart_product.product,
-            product_num,
-            total_sum
-        ))
+async def add_quantity(call: CallbackQuery, callback_data: dict):
+    await change_quantity(call, int(callback_data['id']), 1)
 
-    await call.answer()
+
+async def reduce_quantity(call: CallbackQuery, callback_data: dict):
+    await change_quantity(call, int(callback_data['id']), -1)
 
 
 async def del_product(call: CallbackQuery, callback_data: dict):
     db = call.bot.get('database')
 
     async with db() as session:
-        cart_product = await session.get(Cart, int(callback_data['id']))
-        if not cart_product:
+        if not await Cart.remove(session, int(callback_data['id'])):
             await call.answer(messages.request_new_cart, show_alert=True)
             return
-        await session.refresh(cart_product, ['iiko_user'])
-        await session.refresh(cart_product.iiko_user, ['cart_products'])
-        await session.delete(cart_product)
         await session.commit()
 
-        if len(cart_product.iiko_user.cart_products) == 1:
-            await call.message.delete()
-            await call.message.answer(messages.empty_cart, reply_markup=inline_keyboards.open_menu)
-            return
+        cart = await Cart.get_user_cart(session, call.from_user.id)
 
-        await session.refresh(cart_product.iiko_user, ['cart_products'])
-        await show_cart_product(call, callback_data={'id': cart_product.iiko_user.cart_products[0].id})
+    await show_first_or_empty_cart(call, cart)
+    await call.answer()
 
 
 async def start_order(call: CallbackQuery):
@@ -152,9 +111,8 @@ async def start_order(call: CallbackQuery):
 
     db = call.bot.get('database')
     async with db() as session:
-        iiko_user = await IikoUser.get_by_telegram_id(session, call.from_user.id)
-        await session.refresh(iiko_user, ['cart_products'])
-        if not iiko_user.cart_products:
+        cart = await Cart.get_user_cart(session, call.from_user.id)
+        if not cart.lines:
             await call.message.edit_text(messages.empty_cart, reply_markup=inline_keyboards.open_menu)
             await call.answer('Корзина пуста!', show_alert=True)
             return
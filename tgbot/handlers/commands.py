@@ -18,6 +18,11 @@ async def command_start(message: Message):
             )
             session.add(tg_user)
             await session.commit()
+        elif not tg_user.is_reachable:
+            # User has unblocked the bot
+            tg_user.is_reachable = True
+            tg_user.unreachable_since = None
+            await session.commit()
 
         await session.refresh(tg_user, ['iiko_user'])
 
@@ -5,32 +5,25 @@ from aiogram.utils.exceptions import MessageNotModified
 
 from tgbot.keyboards import inline_keyboards
 from tgbot.misc import messages, callbacks
-from tgbot.services.database.models import Group, Product, TelegramUser, Cart, IikoUser
-from tgbot.services.utils import update_message_content, update_menu_from_api
+from tgbot.services.database.models import Cart, IikoUser
+from tgbot.services.utils import update_message_content
 
 
 async def show_subgroup_or_products(call: CallbackQuery, callback_data: dict):
-    db = call.bot.get('database')
     redis = call.bot.get('redis')
-    iiko = call.bot.get('iiko')
+    menu = call.bot.get('menu')
 
-    async with db() as session:
-        revision = await update_menu_from_api(session, iiko, redis)
-        group = await session.get(Group, callback_data['id'])
-        if group.revision != revision:
-            await call.answer(messages.old_menu, show_alert=True)
-            return
-
-        await session.refresh(group, ['children'])
-        if group.children:
-            text = messages.subgroup_choose.format(group=group.name)
-            revision_groups = filter(lambda grp: grp.revision == group.revision and group.show_in_bot, group.children)
-            keyboard = inline_keyboards.get_groups_keyboard(revision_groups, True)
-        else:
-            await session.refresh(group, ['products'])
-            text = messages.product_choose.format(group=group.name)
-            revision_products = filter(lambda product: product.revision == group.revision and product.show_in_bot, group.products)
-            keyboard = inline_keyboards.get_products_keyboard(revision_products, group.parent_id)
+    snapshot = menu.snapshot
+    group = snapshot.groups.get(callback_data['id'])
+    if not group:
+        await call.answer(messages.old_menu, show_alert=True)
+        return
+
+    if snapshot.children[group.id]:
+        text = messages.subgroup_choose.format(group=group.name)
+    else:
+        text = messages.product_choose.format(group=group.name)
+    keyboard = menu.keyboards.get_group_keyboard(snapshot, group.id)
 
     await update_message_content(call, redis, text, keyboard, group.image_in_bot or group.image_link)
     await call.answer()
@@ -39,16 +32,15 @@ async def show_subgroup_or_products(call: CallbackQuery, callback_data: dict):
 async def show_product(call: CallbackQuery, callback_data: dict):
     db = call.bot.get('database')
     redis = call.bot.get('redis')
-    iiko = call.bot.get('iiko')
+    menu = call.bot.get('menu')
+
+    product = menu.snapshot.products.get(callback_data['id'])
+    if not product:
+        await call.answer(messages.old_menu, show_alert=True)
+        return
 
     async with db() as session:
-        revision = await update_menu_from_api(session, iiko, redis)
         iiko_user = await IikoUser.get_by_telegram_id(session, call.from_user.id)
-        product = await session.get(Product, callback_data['id'])
-        if product.revision != revision:
-            await call.answer(messages.old_menu, show_alert=True)
-            return
-
         text = messages.product.format(name=product.name, description=product.description, price=product.price)
         cart_product = await Cart.get_user_product(session, iiko_user.id, callback_data['id'])
         keyboard = inline_keyboards.get_product_keyboard(product, cart_product)
@@ -59,9 +51,14 @@ async def show_product(call: CallbackQuery, callback_data: dict):
 
 async def add_to_cart(call: CallbackQuery, callback_data: dict):
     db = call.bot.get('database')
+    menu = call.bot.get('menu')
+    product = menu.snapshot.products.get(callback_data['id'])
+    if not product:
+        await call.answer(messages.old_menu, show_alert=True)
+        return
+
     async with db() as session:
         iiko_user = await IikoUser.get_by_telegram_id(session, call.from_user.id)
-        product = await session.get(Product, callback_data['id'])
         cart_product = await Cart.get_user_product(session, iiko_user.id, callback_data['id'])
         if not cart_product:
             new_cart_product = Cart(
@@ -76,20 +73,18 @@ async def add_to_cart(call: CallbackQuery, callback_data: dict):
 
 
 async def get_and_check_cart_product(call: CallbackQuery, product_id, session):
-    redis = call.bot.get('redis')
-    iiko = call.bot.get('iiko')
-    revision = await update_menu_from_api(session, iiko, redis)
+    menu = call.bot.get('menu')
+    product = menu.snapshot.products.get(product_id)
+    if not product:
+        await call.answer(messages.old_menu, show_alert=True)
+        raise CancelHandler
+
     iiko_user = await IikoUser.get_by_telegram_id(session, call.from_user.id)
-    product = await session.get(Product, product_id)
     cart_product = await Cart.get_user_product(session, iiko_user.id, product_id)
-
     if not cart_product:
         await call.answer(messages.old_cart_product, show_alert=True)
         await call.message.edit_reply_markup(inline_keyboards.get_product_keyboard(product, None))
         raise CancelHandler
-    if revision != product.revision:
-        await call.answer(messages.old_menu, show_alert=True)
-        raise CancelHandler
 
     return cart_product, product
 
@@ -105,37 +100,41 @@ async def del_from_cart(call: CallbackQuery, callback_data: dict):
     await call.answer()
 
 
-async def add_quantity(call: CallbackQuery, callback_data: dict):
-    db = call.bot.get('database')
-    async with db() as session:
-        cart_product, product = await get_and_check_cart_product(call, callback_data['id'], session)
-        cart_product.quantity += 1
-        await session.commit()
-
-    try:
-        await call.message.edit_reply_markup(inline_keyboards.get_product_keyboard(product, cart_product))
-    except MessageNotModified:
-        pass
-
+async def change_quantity(call: CallbackQuery, product_id: str, delta: int):
+    menu = call.bot.get('menu')
+    product = menu.snapshot.products.get(product_id)
+    if not product:
+        await call.answer(messages.old_menu, show_alert=True)
+        return
+
+    async def apply(total_delta: int):
+        db = call.bot.get('database')
+        async with db() as session:
+            iiko_user = await IikoUser.get_by_telegram_id(session, call.from_user.id)
+            cart_product = await Cart.get_user_product(session, iiko_user.id, product_id)
+            if cart_product:
+                quantity = await Cart.change_quantity(session, cart_product.id, total_delta)
+                await session.commit()
+                cart_product.quantity = quantity
+                if quantity is None or quantity <= 0:
+                    cart_product = None
+
+        try:
+            await call.message.edit_reply_markup(inline_keyboards.get_product_keyboard(product, cart_product))
+        except MessageNotModified:
+            pass
+
+    cart_buffer = call.bot.get('cart_buffer')
+    cart_buffer.add((call.from_user.id, 'product', product_id), delta, apply)
     await call.answer()
 
 
-async def reduce_quantity(call: CallbackQuery, callback_data: dict):
-    db = call.bot.get('database')
-    async with db() as session:
-        cart_product, product = await get_and_check_cart_product(call, callback_data['id'], session)
-        cart_product.quantity -= 1
-        if cart_product.quantity == 0:
-            await session.delete(cart_product)
-            cart_product = None
-        await session.commit()
+async def add_quantity(call: CallbackQuery, callback_data: dict):
+    await change_quantity(call, callback_data['id'], 1)
 
-    try:
-        await call.message.edit_reply_markup(inline_keyboards.get_product_keyboard(product, cart_product))
-    except MessageNotModified:
-        pass
 
-    await call.answer()
+async def reduce_quantity(call: CallbackQuery, callback_data: dict):
+    await change_quantity(call, callback_data['id'], -1)
 
 
 def register_menu(dp: Dispatcher):
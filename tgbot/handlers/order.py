@@ -1,22 +1,28 @@
 import datetime
+import logging
 import uuid
 from pprint import pprint
 
-from aiogram import Dispatcher
+from aiogram import Bot, Dispatcher
 from aiogram.dispatcher import FSMContext
-from aiogram.types import CallbackQuery, Message, inline_keyboard
-from yookassa import Payment
-from yookassa.domain.response import PaymentResponse
+from aiogram.types import CallbackQuery, Message, ContentType, inline_keyboard
+from sqlalchemy import delete
 
 from tgbot.config import Config
 from tgbot.keyboards import inline_keyboards, reply_keyboards
 from tgbot.misc import states, messages, callbacks, reply_commands
-from tgbot.services.database.models import TelegramUser, Product, OrderProduct, Order as DBOrder, Organization
+from tgbot.services.database.models import (TelegramUser, Product, OrderProduct, Order as DBOrder, Organization, Cart,
+                                            IikoUser, OrderOutbox, SavedAddress)
+from tgbot.services.delivery_zones import DeliveryZoneResolver
 from tgbot.services.iiko.api import Iiko
 from tgbot.services.iiko.schemas import (DeliveryCreate, Order, OrderCustomer, OrderPayment, OrderItem,
-                                         SuitableTerminalGroupsRequest, DeliveryAddress, CalculateCheckinRequest,
-                                         DeliveryPoint, Address, Street)
-from tgbot.services.utils import update_user_from_api, update_menu_from_api, update_organizations_from_api
+                                         CalculateCheckinRequest, DeliveryPoint, Address, Street, AllowedItem,
+                                         Coordinates)
+from tgbot.services.utils import update_user_from_api, update_organizations_from_api
+from tgbot.services.yookassa.api import YooKassa
+from tgbot.services.yookassa.schemas import ApiError as YooKassaApiError, Payment as YooKassaPayment
+
+PAYMENT_MARK_TTL = 24 * 60 * 60  # YooKassa retries notifications for 24 hours
 
 
 async def customer_pickup(call: CallbackQuery):
@@ -45,14 +51,69 @@ async def get_pickup_point(call: CallbackQuery, callback_data: dict, state: FSMC
 
 
 async def start_address_input(call: CallbackQuery, state: FSMContext):
-    await call.message.answer('➡️ Введите название города/населенного пункта',
-                              reply_markup=reply_keyboards.cancel)
+    db = call.bot.get('database')
+    async with db() as session:
+        addresses = await SavedAddress.get_user_addresses(session, call.from_user.id)
+
+    if addresses:
+        await call.message.edit_text('Куда доставить заказ?',
+                                     reply_markup=inline_keyboards.get_saved_addresses_keyboard(addresses))
+        await call.answer()
+        return
+
+    await new_address_input(call, state)
+
+
+async def new_address_input(call: CallbackQuery, state: FSMContext):
+    await call.message.answer('➡️ Введите название города/населенного пункта или отправьте геопозицию',
+                              reply_markup=reply_keyboards.address)
     await call.message.delete()
     await states.Order.first()
     await state.update_data(delivery='1')
     await call.answer()
 
 
+async def choose_saved_address(call: CallbackQuery, callback_data: dict, state: FSMContext):
+    resolver: DeliveryZoneResolver = call.bot.get('delivery_zones')
+    db = call.bot.get('database')
+    async with db() as session:
+        saved_address = await SavedAddress.get_user_address(session, call.from_user.id, int(callback_data['id']))
+        cart = await Cart.get_user_cart(session, call.from_user.id)
+
+    if saved_address is None:
+        await call.answer('Адрес не найден', show_alert=True)
+        return
+
+    address = saved_address.to_state()
+    restrictions_version = await resolver.get_version()
+    # Saved check is still valid for the same zones and not smaller sum
+    if (restrictions_version is None or restrictions_version != saved_address.restrictions_version
+            or cart.total_sum < (saved_address.checked_sum or 0)):
+        if saved_address.house:
+            allowed_item = await resolver.resolve_address(saved_address.city, saved_address.street,
+                                                          saved_address.house, cart.total_sum)
+        else:
+            allowed_item = await resolver.resolve_location(saved_address.latitude, saved_address.longitude,
+                                                           cart.total_sum)
+        if not allowed_item:
+            await call.message.delete()
+            await reject_delivery_point(call.message, state)
+            await call.answer()
+            return
+
+        address.update(organization=allowed_item.organizationId,
+                       terminal_group=allowed_item.terminalGroupId,
+                       delivery_product=allowed_item.deliveryServiceProductId)
+
+    await state.update_data(**address, checked_sum=cart.total_sum, restrictions_version=restrictions_version)
+    await call.message.delete()
+    await call.message.answer(f'Для отмены нажмите кнопку "{reply_commands.cancel}"',
+                              reply_markup=reply_keyboards.cancel)
+    await call.message.answer('К какому времени доставить заказ?', reply_markup=get_delivery_time_keyboard())
+    await states.Order.finishing.set()
+    await call.answer()
+
+
 async def get_city(message: Message, state: FSMContext):
     city = message.text
     if len(city) > 60:
@@ -81,55 +142,73 @@ async def get_house(message: Message, state: FSMContext):
         await message.answer('Номер дома должен быть короче')
         return
 
-    iiko: Iiko = message.bot.get('iiko')
+    resolver: DeliveryZoneResolver = message.bot.get('delivery_zones')
     db = message.bot.get('database')
     async with db() as session:
-        tg_user = await session.get(TelegramUser, message.from_user.id)
-        await session.refresh(tg_user, ['iiko_user'])
-        await session.refresh(tg_user.iiko_user, ['cart_products'])
-
-        payment_sum = 0
-        for cart_product in tg_user.iiko_user.cart_products:
-            await session.refresh(cart_product, ['product'])
-            payment_sum += cart_product.product.price * cart_product.quantity
-
-        organizations = await iiko.get_organizations(False, False)
-        state_data = await state.get_data()
-        suitable_terminals = await iiko.get_terminal_groups_for_delivery(SuitableTerminalGroupsRequest(
-            organizationIds=[str(org.id) for org in organizations.organizations],
-            deliveryAddress=DeliveryAddress(
-                city=state_data['city'],
-                streetName=state_data['street'],
-                house=house
-            ),
-            isCourierDelivery=True,
-            deliverySum=payment_sum
-        ))
-
-        if not suitable_terminals.allowedItems:
-            config = message.bot.get('config')
-            await message.answer(messages.bad_address_or_sum, reply_markup=reply_keyboards.order)
-            await message.answer(messages.min_price_and_zones,
-                                 reply_markup=inline_keyboards.get_delivery_zones_keyboard(config.iiko.map_url, True))
-            await state.finish()
-            return
+        cart = await Cart.get_user_cart(session, message.from_user.id)
 
-        allowed_item = suitable_terminals.allowedItems[0]
-        if allowed_item.deliveryServiceProductId:
+    state_data = await state.get_data()
+    allowed_item = await resolver.resolve_address(state_data['city'], state_data['street'], house, cart.total_sum)
+    await accept_delivery_point(message, state, allowed_item, cart.total_sum, house=house)
+
+
+async def get_location(message: Message, state: FSMContext):
+    resolver: DeliveryZoneResolver = message.bot.get('delivery_zones')
+    db = message.bot.get('database')
+    async with db() as session:
+        cart = await Cart.get_user_cart(session, message.from_user.id)
+
+    latitude, longitude = message.location.latitude, message.location.longitude
+    allowed_item = await resolver.resolve_location(latitude, longitude, cart.total_sum)
+    await accept_delivery_point(message, state, allowed_item, cart.total_sum, latitude=latitude, longitude=longitude)
+
+
+async def reject_delivery_point(message: Message, state: FSMContext):
+    config = message.bot.get('config')
+    await message.answer(messages.bad_address_or_sum, reply_markup=reply_keyboards.order)
+    await message.answer(messages.min_price_and_zones,
+                         reply_markup=inline_keyboards.get_delivery_zones_keyboard(config.iiko.map_url, True))
+    await state.finish()
+
+
+async def accept_delivery_point(message: Message, state: FSMContext, allowed_item: AllowedItem | None,
+                                delivery_sum: float, **address):
+    if not allowed_item:
+        await reject_delivery_point(message, state)
+        return
+
+    delivery_price = 0
+    if allowed_item.deliveryServiceProductId:
+        db = message.bot.get('database')
+        async with db() as session:
             delivery_product = await session.get(Product, allowed_item.deliveryServiceProductId)
             delivery_price = delivery_product.price
-        else:
-            delivery_price = 0
 
     await message.answer(
         messages.good_address.format(delivery_cost=delivery_price, duration=allowed_item.deliveryDurationInMinutes),
         reply_markup=inline_keyboards.get_skip_keyboard('entrance')
     )
-    await state.update_data(house=house,
+    resolver: DeliveryZoneResolver = message.bot.get('delivery_zones')
+    await state.update_data(**address,
+                            checked_sum=delivery_sum,
+                            restrictions_version=resolver.version,
                             delivery_product=allowed_item.deliveryServiceProductId,
                             organization=allowed_item.organizationId,
                             terminal_group=allowed_item.terminalGroupId)
-    await states.Order.next()
+    await states.Order.waiting_for_entrance.set()
+
+
+def get_delivery_time_keyboard():
+    cur_date = datetime.datetime.now()
+    start_date = cur_date + datetime.timedelta(hours=2)
+    if cur_date.weekday() in (4, 5):
+        end_date = datetime.datetime.combine(datetime.date.today(), datetime.time(23, 59)) + datetime.timedelta(
+            minutes=1)
+    else:
+        end_date = datetime.datetime.combine(datetime.date.today(), datetime.time(23, 0))
+    interval = 30
+
+    return inline_keyboards.get_time_keyboard(start_date, end_date, interval, 'ord')
 
 
 async def skip(call: CallbackQuery, callback_data: dict):
@@ -144,17 +223,7 @@ async def skip(call: CallbackQuery, callback_data: dict):
         await call.message.edit_text('➡️ Введите комментарий',
                                      reply_markup=inline_keyboards.get_skip_keyboard('comment'))
     elif value == 'comment':
-        cur_date = datetime.datetime.now()
-        start_date = cur_date + datetime.timedelta(hours=2)
-        if cur_date.weekday() in (4, 5):
-            end_date = datetime.datetime.combine(datetime.date.today(), datetime.time(23, 59)) + datetime.timedelta(
-                minutes=1)
-        else:
-            end_date = datetime.datetime.combine(datetime.date.today(), datetime.time(23, 0))
-        interval = 30
-
-        await call.message.edit_text('К какому времени доставить заказ?',
-                                     reply_markup=inline_keyboards.get_time_keyboard(start_date, end_date, interval, 'ord'))
+        await call.message.edit_text('К какому времени доставить заказ?', reply_markup=get_delivery_time_keyboard())
 
     await states.Order.next()
     await call.answer()
@@ -202,17 +271,7 @@ async def get_comment(message: Message, state: FSMContext):
                              reply_markup=inline_keyboards.get_skip_keyboard('comment'))
         return
 
-    cur_date = datetime.datetime.now()
-    start_date = cur_date + datetime.timedelta(hours=2)
-    if cur_date.weekday() in (4, 5):
-        end_date = datetime.datetime.combine(datetime.date.today(), datetime.time(23, 59)) + datetime.timedelta(
-            minutes=1)
-    else:
-        end_date = datetime.datetime.combine(datetime.date.today(), datetime.time(23, 0))
-    interval = 30
-
-    await message.answer('К какому времени доставить заказ?',
-                         reply_markup=inline_keyboards.get_time_keyboard(start_date, end_date, interval, 'ord'))
+    await message.answer('К какому времени доставить заказ?', reply_markup=get_delivery_time_keyboard())
     await state.update_data(comment=comment)
     print(await state.get_state())
     await states.Order.next()
@@ -240,18 +299,12 @@ async def with_bonuses(call: CallbackQuery, state: FSMContext):
     db = call.bot.get('database')
     iiko = call.bot.get('iiko')
     async with db() as session:
-        tg_user = await session.get(TelegramUser, call.from_user.id)
-        await session.refresh(tg_user, ['iiko_user'])
-        iiko_user = await update_user_from_api(session, iiko, tg_user.iiko_user.id)
-        await session.refresh(iiko_user, ['cart_products'])
+        iiko_user = await IikoUser.get_by_telegram_id(session, call.from_user.id)
+        iiko_user = await update_user_from_api(session, iiko, iiko_user.id)
+        cart = await Cart.get_user_cart(session, call.from_user.id)
 
-        payment_sum = 0
-        for cart_product in iiko_user.cart_products:
-            await session.refresh(cart_product, ['product'])
-            payment_sum += cart_product.product.price * cart_product.quantity
-
-        if iiko_user.bonus_balance >= payment_sum:
-            await create_order(call, state)
+        if iiko_user.bonus_balance >= cart.total_sum:
+            await create_order(call.bot, call.from_user.id, state)
 
     await state.update_data(bonuses='1')
     await call.message.edit_text('Выберите способ оплаты', reply_markup=inline_keyboards.payment_type_choose)
@@ -268,27 +321,21 @@ async def online_pay(call: CallbackQuery, state: FSMContext):
     config = call.bot.get('config')
     db = call.bot.get('database')
     iiko = call.bot.get('iiko')
-    redis = call.bot.get('redis')
+    menu = call.bot.get('menu')
 
     state_data = await state.get_data()
     async with db() as session:
-        revision = await update_menu_from_api(session, iiko, redis)
-
-        tg_user = await session.get(TelegramUser, call.from_user.id)
-        await session.refresh(tg_user, ['iiko_user'])
-        iiko_user = await update_user_from_api(session, iiko, tg_user.iiko_user.id)
-        await session.refresh(iiko_user, ['cart_products'])
-
-        payment_sum = 0
-        for cart_product in iiko_user.cart_products:
-            await session.refresh(cart_product, ['product'])
-            if cart_product.product.revision != revision:
-                await call.message.answer(
-                    'Некоторых товаров из корзины больше нет в меню! Проверьте корзину и оформите заказ заново',
-                    reply_markup=reply_keyboards.order)
-                await state.finish()
-                return
-            payment_sum += cart_product.product.price * cart_product.quantity
+        iiko_user = await IikoUser.get_by_telegram_id(session, call.from_user.id)
+        iiko_user = await update_user_from_api(session, iiko, iiko_user.id)
+        cart = await Cart.get_user_cart(session, call.from_user.id)
+
+        if any(cart_product.product.revision != menu.revision for cart_product in cart.lines):
+            await call.message.answer(
+                'Некоторых товаров из корзины больше нет в меню! Проверьте корзину и оформите заказ заново',
+                reply_markup=reply_keyboards.order)
+            await state.finish()
+            return
+        payment_sum = cart.total_sum
 
         if state_data.get('bonuses'):
             payment_sum -= iiko_user.bonus_balance
@@ -297,18 +344,14 @@ async def online_pay(call: CallbackQuery, state: FSMContext):
             delivery_product = await session.get(Product, del_prod_id)
             payment_sum += delivery_product.price
 
-    payment = Payment.create({
-        'amount': {
-            'value': payment_sum,
-            'currency': 'RUB'
-        },
-        'confirmation': {
-            'type': 'redirect',
-            'return_url': config.yookassa.redirect_url
-        },
-        'capture': True,
-        'description': 'Заказ в суши-баре AYAMI'
-    }, uuid.uuid4())
+    yookassa: YooKassa = call.bot.get('yookassa')
+    try:
+        payment = await yookassa.create_payment(payment_sum, 'Заказ в суши-баре AYAMI', config.yookassa.redirect_url,
+                                                metadata={'telegram_id': call.from_user.id})
+    except YooKassaApiError as e:
+        logging.error(f'Payment was not created: {e}')
+        await call.answer(messages.payment_error, show_alert=True)
+        return
 
     pay_url = payment.confirmation.confirmation_url
     await state.update_data(payment_id=payment.id)
@@ -317,35 +360,28 @@ async def online_pay(call: CallbackQuery, state: FSMContext):
     await call.answer()
 
 
-async def create_order(call, state, payment: PaymentResponse | None = None):
+async def create_order(bot: Bot, telegram_id: int, state: FSMContext, payment: YooKassaPayment | None = None):
     state_data = await state.get_data()
-    db = call.bot.get('database')
-    config: Config = call.bot.get('config')
-    iiko: Iiko = call.bot.get('iiko')
+    db = bot.get('database')
+    config: Config = bot.get('config')
+    iiko: Iiko = bot.get('iiko')
+    menu = bot.get('menu')
     async with db() as session:
-        tg_user = await session.get(TelegramUser, call.from_user.id)
-        await session.refresh(tg_user, ['iiko_user'])
-        iiko_user = await update_user_from_api(session, iiko, tg_user.iiko_user.id)
-        await session.refresh(iiko_user, ['cart_products'])
-
-        if state_data.get('offline'):
-            redis = call.bot.get('redis')
-            revision = await update_menu_from_api(session, iiko, redis)
+        iiko_user = await IikoUser.get_by_telegram_id(session, telegram_id)
+        iiko_user = await update_user_from_api(session, iiko, iiko_user.id)
+        cart = await Cart.get_user_cart(session, telegram_id)
+
+        if state_data.get('offline') and any(line.product.revision != menu.revision for line in cart.lines):
+            await bot.send_message(
+                telegram_id,
+                'Некоторых товаров из корзины больше нет в меню! Проверьте корзину и оформите заказ заново',
+                reply_markup=reply_keyboards.order)
+            await state.finish()
+            return
 
         items = list()
-        payment_sum = 0
-        for cart_product in iiko_user.cart_products:
-            await session.refresh(cart_product, ['product'])
-
-            if state_data.get('offline') and cart_product.product.revision != revision:
-                await call.message.answer(
-                    'Некоторых товаров из корзины больше нет в меню! Проверьте корзину и оформите заказ заново',
-                    reply_markup=reply_keyboards.order)
-                await state.finish()
-                return
-
-            payment_sum += cart_product.product.price
-
+        payment_sum = cart.total_sum
+        for cart_product in cart.lines:
             items.append(
                 OrderItem(
                     productId=str(cart_product.product.id),
@@ -384,18 +420,27 @@ async def create_order(call, state, payment: PaymentResponse | None = None):
         if state_data.get('delivery'):
             service_type = 'DeliveryByCourier'
             order_type = 'delivery'
-            delivery_point = DeliveryPoint(
-                address=Address(
-                    street=Street(
-                        city=state_data['city'],
-                        name=state_data['street']
-                    ),
-                    house=state_data.get('house'),
-                    flat=state_data.get('flat'),
-                    entrance=state_data.get('entrance'),
-                    floor=state_data.get('floor')
+            if state_data.get('latitude'):
+                # Address is not known for a shared location, so the rest of it goes to the comment
+                details = {'подъезд': state_data.get('entrance'), 'этаж': state_data.get('floor'),
+                           'кв.': state_data.get('flat')}
+                delivery_point = DeliveryPoint(
+                    coordinates=Coordinates(latitude=state_data['latitude'], longitude=state_data['longitude']),
+                    comment=', '.join(f'{name} {value}' for name, value in details.items() if value) or None
+                )
+            else:
+                delivery_point = DeliveryPoint(
+                    address=Address(
+                        street=Street(
+                            city=state_data['city'],
+                            name=state_data['street']
+                        ),
+                        house=state_data.get('house'),
+                        flat=state_data.get('flat'),
+                        entrance=state_data.get('entrance'),
+                        floor=state_data.get('floor')
+                    )
                 )
-            )
 
         payments = list()
         if payment:
@@ -411,7 +456,8 @@ async def create_order(call, state, payment: PaymentResponse | None = None):
         bonus_pay = 0
         if state_data.get('bonuses'):
             if not payment and payment_sum <= iiko_user.bonus_balance:
-                await call.message.answer(
+                await bot.send_message(
+                    telegram_id,
                     'У вас недостаточно бонусного баланса для оплаты! Оформите заказ заново',
                     reply_markup=reply_keyboards.order
                 )
@@ -431,7 +477,9 @@ async def create_order(call, state, payment: PaymentResponse | None = None):
             cur_date = datetime.date.today()
             time = datetime.datetime.combine(cur_date, datetime.time(int(hour), int(minute))).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
 
+        order_id = uuid.uuid4()  # Sent to iiko as is, so resubmitting the order doesn't create a duplicate
         order = Order(
+            id=str(order_id),
             phone='+' + iiko_user.phone,
             orderServiceType=service_type,
             customer=OrderCustomer(
@@ -451,18 +499,8 @@ async def create_order(call, state, payment: PaymentResponse | None = None):
             order=order
         )
 
-        print('NO IIKO')
-
-        # pprint(new_order.model_dump())
-
-        # order_result = await iiko.create_delivery(new_order)
-        #
-        # pprint(order_result)
-
-        print('NO IIKO')
-
         db_order = DBOrder(
-            id=uuid.uuid4(),  # TODO: заменить на id из iiko
+            id=order_id,
             iiko_user_id=iiko_user.id,
             payment_sum=payment_sum - delivery_price,
             bonus_pay=bonus_pay,
@@ -472,16 +510,17 @@ async def create_order(call, state, payment: PaymentResponse | None = None):
         )
         session.add(db_order)
 
-        for cart_product in iiko_user.cart_products:
-            await session.refresh(cart_product, ['product'])
-
-            db_product = OrderProduct(
+        session.add_all([
+            OrderProduct(
                 order_id=db_order.id,
-                product_id=cart_product.product.id,
+                product_id=cart_product.product_id,
                 quantity=cart_product.quantity
-            )
-            session.add(db_product)
-            await session.delete(cart_product)
+            ) for cart_product in cart.lines
+        ])
+        await session.execute(delete(Cart).where(Cart.id.in_([cart_product.id for cart_product in cart.lines])))
+        OrderOutbox.create(session, 'delivery', new_order, telegram_id)
+        if state_data.get('delivery'):
+            await SavedAddress.save(session, iiko_user.id, state_data)
 
         await session.commit()
 
@@ -492,13 +531,14 @@ async def create_order(call, state, payment: PaymentResponse | None = None):
             cur_time = datetime.datetime.now()
             time = f'{cur_time.hour + 2}:{cur_time.minute}'
         if state_data.get('delivery'):
-            await call.message.answer(messages.delivery_order_created.format(
+            await bot.send_message(telegram_id, messages.delivery_order_created.format(
                 time=time,
-                address=f'{state_data.get("street")} {state_data.get("house")}'
+                address=f'{state_data.get("street")} {state_data.get("house")}' if state_data.get('house')
+                else 'по геопозиции'
             ), reply_markup=reply_keyboards.main_menu)
         else:
             organization = await session.get(Organization, state_data['organization'])
-            await call.message.answer(messages.pickup_order_created.format(
+            await bot.send_message(telegram_id, messages.pickup_order_created.format(
                 time=time,
                 address=organization.address
             ), reply_markup=reply_keyboards.main_menu)
@@ -506,33 +546,89 @@ async def create_order(call, state, payment: PaymentResponse | None = None):
         await state.finish()
 
 
+async def confirm_payment(bot: Bot, telegram_id: int, state: FSMContext, payment: YooKassaPayment) -> bool:
+    """Creates order for the succeeded payment only once, returns False if it is already done"""
+    redis = bot.get('redis')
+    # Webhook and "Проверить оплату" button may come at the same time
+    if not await redis.set(f'payment:{payment.id}:order', 1, nx=True, ex=PAYMENT_MARK_TTL):
+        return False
+
+    try:
+        await create_order(bot, telegram_id, state, payment)
+    except Exception:
+        await redis.delete(f'payment:{payment.id}:order')
+        raise
+
+    return True
+
+
 async def check_payment(call: CallbackQuery, callback_data: dict, state: FSMContext):
-    payment = Payment.find_one(callback_data['id'])
+    redis = call.bot.get('redis')
+    if await redis.exists(f'payment:{callback_data["id"]}:order'):
+        await call.answer(messages.payment_already_confirmed, show_alert=True)
+        return
+
     state_data = await state.get_data()
-    if state_data['payment_id'] != callback_data['id']:
+    if state_data.get('payment_id') != callback_data['id']:
         await call.answer('Платёж не соответствует заказу!', show_alert=True)
         return
+
+    yookassa: YooKassa = call.bot.get('yookassa')
+    try:
+        payment = await yookassa.get_payment(callback_data['id'])
+    except YooKassaApiError as e:
+        logging.error(f'Payment {callback_data["id"]} was not checked: {e}')
+        await call.answer(messages.payment_error, show_alert=True)
+        return
     if payment.status != 'succeeded':
         await call.answer('Оплата не подтверждена!', show_alert=True)
         return
 
-    await create_order(call, state, payment)
+    if not await confirm_payment(call.bot, call.from_user.id, state, payment):
+        await call.answer(messages.payment_already_confirmed, show_alert=True)
+        return
 
     await call.answer()
 
 
+async def process_payment_notification(dp: Dispatcher, payment: YooKassaPayment):
+    """Called by YooKassa webhook with the payment already verified through API"""
+    telegram_id = (payment.metadata or {}).get('telegram_id')
+    if not telegram_id:
+        logging.warning(f'Payment {payment.id} has no telegram_id in metadata')
+        return
+
+    telegram_id = int(telegram_id)
+    state = dp.current_state(chat=telegram_id, user=telegram_id)
+    state_data = await state.get_data()
+    if state_data.get('payment_id') != payment.id:
+        # Already processed or user has started a new order
+        return
+
+    if payment.status == 'succeeded':
+        await confirm_payment(dp.bot, telegram_id, state, payment)
+    elif payment.status == 'canceled':
+        await state.finish()
+        await dp.bot.send_message(telegram_id, messages.payment_canceled, reply_markup=reply_keyboards.order)
+
+
 async def offline_pay(call: CallbackQuery, state: FSMContext):
     await state.update_data(offline=True)
-    await create_order(call, state)
+    await create_order(call.bot, call.from_user.id, state)
     await call.answer()
 
 
 def register_order(dp: Dispatcher):
     dp.register_callback_query_handler(start_address_input, text='delivery')
+    dp.register_callback_query_handler(new_address_input, text='new_address')
+    dp.register_callback_query_handler(choose_saved_address, callbacks.saved_address.filter())
     dp.register_callback_query_handler(customer_pickup, text='pickup')
 
     dp.register_callback_query_handler(get_pickup_point, callbacks.organization.filter(action='ord'), state=states.Order.finishing)
 
+    dp.register_message_handler(get_location, content_types=ContentType.LOCATION,
+                                state=[states.Order.waiting_for_city, states.Order.waiting_for_street,
+                                       states.Order.waiting_for_house])
     dp.register_message_handler(get_city, state=states.Order.waiting_for_city)
     dp.register_message_handler(get_street, state=states.Order.waiting_for_street)
     dp.register_message_handler(get_house, state=states.Order.waiting_for_house)
@@ -6,79 +6,55 @@ from aiogram.types import Message, CallbackQuery, InputFile
 
 from tgbot.keyboards import reply_keyboards, inline_keyboards
 from tgbot.misc import reply_commands, messages
-from tgbot.services.database.models import TelegramUser
-from tgbot.services.database.models.group import Group
-from tgbot.services.utils import update_menu_from_api
+from tgbot.services.database.models import Cart
+from tgbot.services.utils import get_photo
 
 
 async def send_categories(message: Message):
-    db = message.bot.get('database')
-    iiko = message.bot.get('iiko')
-    redis = message.bot.get('redis')
-
-    async with db() as session:
-        revision = await update_menu_from_api(session, iiko, redis)
-        main_groups = await Group.get_main_groups(session, revision)
+    menu = message.bot.get('menu')
+    keyboard = menu.keyboards.get_root_keyboard(menu.snapshot)
 
-    await message.answer(messages.groups_choose, reply_markup=inline_keyboards.get_groups_keyboard(main_groups))
+    await message.answer(messages.groups_choose, reply_markup=keyboard)
 
 
 async def show_categories(call: CallbackQuery):
-    db = call.bot.get('database')
-    iiko = call.bot.get('iiko')
-    redis = call.bot.get('redis')
-
-    async with db() as session:
-        revision = await update_menu_from_api(session, iiko, redis)
-        main_groups = await Group.get_main_groups(session, revision)
+    menu = call.bot.get('menu')
+    keyboard = menu.keyboards.get_root_keyboard(menu.snapshot)
 
     if call.message.photo:
-        await call.message.answer(messages.groups_choose, reply_markup=inline_keyboards.get_groups_keyboard(main_groups))
+        await call.message.answer(messages.groups_choose, reply_markup=keyboard)
         await call.message.delete()
     else:
-        await call.message.edit_text(messages.groups_choose, reply_markup=inline_keyboards.get_groups_keyboard(main_groups))
+        await call.message.edit_text(messages.groups_choose, reply_markup=keyboard)
 
 
 async def send_cart(message: Message):
     db = message.bot.get('database')
-    redis = message.bot.get('redis')
-    iiko = message.bot.get('iiko')
+    menu = message.bot.get('menu')
     async with db() as session:
-        revision = await update_menu_from_api(session, iiko, redis)
-        tg_user = await session.get(TelegramUser, message.from_id)
-        await session.refresh(tg_user, ['iiko_user'])
-        await session.refresh(tg_user.iiko_user, ['cart_products'])
-        total_sum = 0
-        for ind, cart_product in enumerate(tg_user.iiko_user.cart_products):
-            await session.refresh(cart_product, ['product'])
-            if cart_product.product.revision != revision:
-                await session.delete(cart_product)
-                tg_user.iiko_user.cart_products.remove(cart_product)
-                continue
-
-            total_sum += cart_product.quantity * cart_product.product.price
-
-        if not tg_user.iiko_user.cart_products:
+        if await Cart.clear_old_products(session, message.from_id, menu.revision):
+            await session.commit()
+        cart = await Cart.get_user_cart(session, message.from_id)
+
+        if not cart.lines:
             await message.answer(messages.empty_cart, reply_markup=inline_keyboards.open_menu)
             return
 
-        await session.commit()
-
-        current_product = tg_user.iiko_user.cart_products[0]
+        current_product = cart.lines[0]
 
         text = messages.product.format(
             name=current_product.product.name,
             price=current_product.product.price,
             description=current_product.product.description
         )
-        keyboard = inline_keyboards.get_cart_keyboard(tg_user.iiko_user.cart_products, current_product.product,
-                                                      1, total_sum)
+        keyboard = inline_keyboards.get_cart_keyboard(cart.lines, current_product.product, 1, cart.total_sum)
 
         if current_product.product.image_link:
             redis = message.bot.get('redis')
-            photo_id = await redis.get(current_product.product.image_link)
-            photo = photo_id.decode() if photo_id else InputFile.from_url(current_product.product.image_link)
-            await message.answer_photo(photo=photo, caption=text, reply_markup=keyboard)
+            photo = await get_photo(message.bot, redis, current_product.product.image_link)
+            msg = await message.answer_photo(photo=photo, caption=text, reply_markup=keyboard)
+            if isinstance(photo, InputFile):
+                await redis.set(current_product.product.image_link, msg.photo[-1].file_id)
         else:
             await message.answer(text, reply_markup=keyboard)
 
@@ -1,5 +1,5 @@
 import datetime
-from pprint import pprint
+import uuid
 
 from aiogram import Dispatcher
 from aiogram.dispatcher import FSMContext
@@ -7,9 +7,10 @@ from aiogram.types import CallbackQuery, Message
 
 from tgbot.keyboards import reply_keyboards, inline_keyboards
 from tgbot.misc import callbacks, states, messages
-from tgbot.services.database.models import IikoUser
-from tgbot.services.iiko.api import Iiko
-from tgbot.services.iiko.schemas import CreateReserveRequest, Customer, OrderCustomer, Guests
+from tgbot.services.database.models import IikoUser, OrderOutbox
+from tgbot.services.iiko.schemas import CreateReserveRequest, OrderCustomer, Guests
+from tgbot.services.reservations import ReservationPlanner, RESERVE_DURATION
+from tgbot.services.utils import generate_dates
 
 
 async def start_reserve_table(call: CallbackQuery, callback_data: dict, state: FSMContext):
@@ -44,17 +45,25 @@ async def get_date(message: Message, state: FSMContext):
         return
 
     if date.weekday() in (4, 5):
-        end_date = datetime.datetime.combine(date.today(), datetime.time(22, 0))
+        end_date = datetime.datetime.combine(date.date(), datetime.time(22, 0))
     else:
-        end_date = datetime.datetime.combine(date.today(), datetime.time(21, 0))
+        end_date = datetime.datetime.combine(date.date(), datetime.time(21, 0))
     interval = 30
 
     if now.date() == date.date():
         start_date = now + datetime.timedelta(hours=2)
     else:
-        start_date = datetime.datetime.combine(date.today(), datetime.time(9, 0))
+        start_date = datetime.datetime.combine(date.date(), datetime.time(9, 0))
 
-    keyboard = inline_keyboards.get_time_keyboard(start_date, end_date, interval, 'res')
+    state_data = await state.get_data()
+    planner: ReservationPlanner = message.bot.get('reservations')
+    day = await planner.get_day(state_data['organization'], date.date())
+    free_slots = day.occupancy.get_free_slots(list(generate_dates(start_date, end_date, interval)))
+    if not free_slots:
+        await message.answer('На выбранную дату нет свободных мест! ➡️ Введите другую дату')
+        return
+
+    keyboard = inline_keyboards.get_times_keyboard(free_slots, 'res')
     await message.answer('Выберите время бронирования', reply_markup=keyboard)
     await state.update_data(date=date.date().isoformat())
     await states.ReserveTable.next()
@@ -72,54 +81,28 @@ async def get_time(call: CallbackQuery, callback_data: dict, state: FSMContext):
         await states.ReserveTable.waiting_for_date.set()
         return
 
+    planner: ReservationPlanner = call.bot.get('reservations')
+    day = await planner.get_day(state_data['organization'], date)
+    table = day.occupancy.get_free_table(reserve_date)
+    if table is None:
+        await call.answer('Это время уже занято, выберите другое', show_alert=True)
+        return
+
     db = call.bot.get('database')
     async with db() as session:
         iiko_user = await IikoUser.get_by_telegram_id(session, call.from_user.id)
 
-    iiko: Iiko = call.bot.get('iiko')
-    print(state_data['organization'])
-    terminal_groups = await iiko.get_terminal_groups([state_data['organization']])
-    pprint(terminal_groups.model_dump())
-    terminal_group_id = terminal_groups.terminalGroups[0].items[0].id
-
-    tables = await iiko.get_available_tables([str(terminal_group_id)], False)
-    section_ids = list()
-    all_tables = set()
-    for section in tables.restaurantSections:
-        section_ids.append(str(section.id))
-        for table in section.tables:
-            all_tables.add(str(table.id))
-
-    reserves = await iiko.get_reserves(
-        section_ids,
-        reserve_date.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
-        (reserve_date + datetime.timedelta(minutes=120)).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-    )
-
-    reserved_tables = set()
-    for reserve in reserves.reserves:
-        for table in reserve.tableIds:
-            reserved_tables.add(str(table))
-
-    available_tables = all_tables - reserved_tables
-    if not available_tables:
-        await call.message.answer('На выбранную дату и время нет свободных мест!', reply_markup=reply_keyboards.main_menu)
-        await call.answer()
-        await state.finish()
-        return
-
-    table = available_tables.pop()
-
     request = CreateReserveRequest(
+        id=str(uuid.uuid4()),  # Makes resubmitting from the outbox idempotent
         organizationId=state_data['organization'],
-        terminalGroupId=str(terminal_group_id),
+        terminalGroupId=day.terminal_group_id,
         customer=OrderCustomer(
             id=str(iiko_user.id),
             type='regular'
         ),
         phone='+' + iiko_user.phone,
         comment='Из бота',
-        durationInMinutes=120,
+        durationInMinutes=RESERVE_DURATION,
         shouldRemind=True,
         tableIds=[table],
         estimatedStartTime=reserve_date.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
@@ -128,13 +111,11 @@ async def get_time(call: CallbackQuery, callback_data: dict, state: FSMContext):
         )
     )
 
-    pprint(request.model_dump())
-
-    print('NO IIKO')
-
-    # created_reserve = await iiko.create_reserve(request)
-
-    print('NO IIKO')
+    async with db() as session:
+        OrderOutbox.create(session, 'reserve', request, call.from_user.id)
+        await session.commit()
+    # Until the day is reloaded, the table must not be given to someone else
+    day.occupancy.book(table, reserve_date)
 
     await call.message.answer(messages.reserve_created, reply_markup=reply_keyboards.main_menu)
     await state.finish()
@@ -3,7 +3,7 @@ from datetime import datetime
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 from tgbot.misc import callbacks
-from tgbot.services.database.models import Group, Product, Cart, Organization
+from tgbot.services.database.models import Group, Product, Cart, Organization, SavedAddress
 from tgbot.services.utils import generate_dates
 
 
@@ -127,6 +127,10 @@ def get_delivery_zones_keyboard(map_url, add_menu=False):
 
 
 def get_time_keyboard(start_time: datetime, end_time: datetime, interval: int, action):
+    return get_times_keyboard(generate_dates(start_time, end_time, interval), action)
+
+
+def get_times_keyboard(dates, action):
     keyboard = InlineKeyboardMarkup(row_width=3)
 
     if action == 'ord':
@@ -134,7 +138,6 @@ def get_time_keyboard(start_time: datetime, end_time: datetime, interval: int, a
             InlineKeyboardButton('Как можно скорее', callback_data=callbacks.time.new(time='', action=action))
         )
 
-    dates = generate_dates(start_time, end_time, interval)
     buttons = [InlineKeyboardButton(date.strftime('%H:%M'),
                                     callback_data=callbacks.time.new(time=date.strftime('%H-%M'), action=action)) for date in dates]
     keyboard.add(*buttons)
@@ -174,6 +177,20 @@ def get_organizations_keyboard(organizations: list[Organization], action):
     return keyboard
 
 
+def get_saved_addresses_keyboard(addresses: list[SavedAddress]):
+    keyboard = InlineKeyboardMarkup(row_width=1)
+
+    for address in addresses:
+        keyboard.add(
+            InlineKeyboardButton(address.title, callback_data=callbacks.saved_address.new(id=address.id))
+        )
+    keyboard.add(
+        InlineKeyboardButton('➕ Новый адрес', callback_data='new_address')
+    )
+
+    return keyboard
+
+
 def get_orders_keyboard(orders_count, ind):
     keyboard = InlineKeyboardMarkup()
 
@@ -0,0 +1,52 @@
+from aiogram.types import InlineKeyboardMarkup
+
+from tgbot.keyboards import inline_keyboards
+from tgbot.services.menu.snapshot import MenuSnapshot
+
+
+class MenuKeyboardCache:
+    """
+    Prebuilt groups and products keyboards for one menu snapshot.
+
+    Keys are (revision, group id), None is used as group id for the root groups keyboard.
+    Everything is dropped as soon as another snapshot is passed.
+    """
+
+    def __init__(self):
+        self._snapshot: MenuSnapshot | None = None
+        self._keyboards: dict[tuple[int | None, str | None], InlineKeyboardMarkup] = dict()
+
+    def get_root_keyboard(self, snapshot: MenuSnapshot) -> InlineKeyboardMarkup:
+        return self.get_group_keyboard(snapshot, None)
+
+    def get_group_keyboard(self, snapshot: MenuSnapshot, group_id: str | None) -> InlineKeyboardMarkup:
+        if snapshot is not self._snapshot:
+            self.reset(snapshot)
+
+        key = (snapshot.revision, group_id)
+        keyboard = self._keyboards.get(key)
+        if keyboard is None:
+            keyboard = self._keyboards[key] = self._build_keyboard(snapshot, group_id)
+
+        return keyboard
+
+    def reset(self, snapshot: MenuSnapshot):
+        self._snapshot = snapshot
+        self._keyboards = dict()
+
+    def warm(self, snapshot: MenuSnapshot):
+        self.reset(snapshot)
+        self.get_root_keyboard(snapshot)
+        for group_id in snapshot.groups:
+            self.get_group_keyboard(snapshot, group_id)
+
+    @staticmethod
+    def _build_keyboard(snapshot: MenuSnapshot, group_id: str | None) -> InlineKeyboardMarkup:
+        if group_id is None:
+            return inline_keyboards.get_groups_keyboard(snapshot.root_groups)
+
+        if snapshot.children[group_id]:
+            return inline_keyboards.get_groups_keyboard(snapshot.visible_children[group_id], True)
+
+        return inline_keyboards.get_products_keyboard(snapshot.visible_products[group_id],
+                                                      snapshot.groups[group_id].parent_id)
@@ -17,6 +17,12 @@ request_contact.add(KeyboardButton(reply_commands.share_phone, request_contact=T
 cancel = ReplyKeyboardMarkup(resize_keyboard=True)
 cancel.add(KeyboardButton(reply_commands.cancel))
 
+address = ReplyKeyboardMarkup(resize_keyboard=True, row_width=1)
+address.add(
+    KeyboardButton(reply_commands.share_location, request_location=True),
+    KeyboardButton(reply_commands.cancel)
+)
+
 order = ReplyKeyboardMarkup(resize_keyboard=True, row_width=1)
 order.add(
     KeyboardButton(reply_commands.open_menu),
@@ -23,3 +23,5 @@ skip = CallbackData('skip', 'value')
 organization = CallbackData('org', 'id', 'action')
 
 order = CallbackData('order', 'ind')
+
+saved_address = CallbackData('addr', 'id')
@@ -153,3 +153,25 @@ reserve_created = (
     'Когда администратор подтвердит бронирование, Вам позвонят, чтобы согласовать детали.\n'
     'Обычно это занимает не более 10 минут.'
 )
+
+payment_error = (
+    'Не удалось связаться с платёжной системой. Попробуйте ещё раз через минуту'
+)
+
+payment_already_confirmed = (
+    'Оплата по этому заказу уже подтверждена, заказ оформлен'
+)
+
+payment_canceled = (
+    'Оплата не прошла или была отменена. Оформите заказ заново'
+)
+
+order_statuses = {
+    'WaitCooking': 'Ваш заказ принят и скоро начнёт готовиться',
+    'CookingStarted': 'Ваш заказ готовится 🍣',
+    'CookingCompleted': 'Ваш заказ готов!',
+    'OnWay': 'Курьер уже везёт ваш заказ 🚗',
+    'Delivered': 'Заказ доставлен. Приятного аппетита!',
+    'Cancelled': 'Ваш заказ отменён. Если это ошибка, свяжитесь с нами',
+    'Error': 'Не удалось оформить заказ в ресторане. Мы скоро свяжемся с вами'
+}
@@ -8,3 +8,4 @@ open_menu = '📖 Открыть меню'
 cart = '🛒 Корзина'
 main_menu = '🏠 Главное меню'
 delivery_zones = 'Зоны доставки'
+share_location = '📍 Отправить геопозицию'
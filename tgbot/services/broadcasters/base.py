@@ -1,10 +1,13 @@
 import abc
 import asyncio
 import logging
-from typing import Dict, Optional, Tuple, List, Union
+from contextlib import aclosing
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple, List, Union
 
 from aiogram import Bot
+from aiogram.utils import exceptions
 
+from tgbot.services.rate_limiter import TokenBucket
 from .types import ChatsType, MarkupType, ChatIdType
 
 
@@ -32,7 +35,10 @@ class BaseBroadcaster(abc.ABC):
             reply_markup: MarkupType = None,
             bot: Optional[Bot] = None,
             bot_token: Optional[str] = None,
-            timeout: float = 0.05,
+            rate: float = 25,
+            concurrency: int = 20,
+            on_result: Optional[Callable[[Dict, bool], Awaitable]] = None,
+            keep_results: bool = True,
             logger=__name__,
     ):
         self._setup_chats(chats, kwargs)
@@ -42,7 +48,12 @@ class BaseBroadcaster(abc.ABC):
         self.allow_sending_without_reply = allow_sending_without_reply
         self.reply_markup = reply_markup
         self._setup_bot(bot, bot_token)
-        self.timeout = timeout
+        # Telegram allows about 30 messages per second to different chats
+        self.rate_limiter = TokenBucket(rate)
+        self.concurrency = concurrency
+        self.on_result = on_result
+        # Lists of processed chats grow with the audience, streamed mailings report through on_result only
+        self.keep_results = keep_results
 
         if not isinstance(logger, logging.Logger):
             logger = logging.getLogger(logger)
@@ -53,6 +64,10 @@ class BaseBroadcaster(abc.ABC):
         self._is_running: bool = False
         self._successful: List[Dict] = []
         self._failure: List[Dict] = []
+        self._sent_count: int = 0
+        self._processed_count: int = 0
+        self._unreachable: List[ChatIdType] = []
+        self._stopped: bool = False
 
     def __str__(self) -> str:
         attributes = [
@@ -60,7 +75,7 @@ class BaseBroadcaster(abc.ABC):
             ('is_running', self._is_running),
         ]
         if self._is_running:
-            attributes.append(('progress', f'{len(self.successful)}/{len(self.chats)}'))
+            attributes.append(('progress', f'{self._sent_count}/{self._get_total()}'))
         attributes = '; '.join((f'{key}={str(value)}' for key, value in attributes))
         return f'<{self.__class__.__name__}({attributes})>'
 
@@ -77,6 +92,11 @@ class BaseBroadcaster(abc.ABC):
         else:
             return self.successful
 
+    def pop_unreachable(self) -> List[ChatIdType]:
+        """Chats that blocked the bot or were deleted since the last call"""
+        unreachable, self._unreachable = self._unreachable, []
+        return unreachable
+
     @property
     def failure(self) -> List[Dict]:
         return self._failure
@@ -110,6 +130,8 @@ class BaseBroadcaster(abc.ABC):
     def _setup_chats(self, chats: ChatsType, kwargs: Optional[Dict] = None) -> None:
         if not kwargs:
             kwargs = {}
+        self._chats_kwargs = kwargs
+        self._chats_stream: Optional[AsyncIterable[ChatIdType]] = None
         if isinstance(chats, int) or isinstance(chats, str):
             self.chats = [{'chat_id': chats, **kwargs}]
         elif isinstance(chats, list):
@@ -132,9 +154,30 @@ class BaseBroadcaster(abc.ABC):
                     {'chat_id': chat.pop('chat_id'), **chat, **kwargs}
                     for chat in chats if chat.get('chat_id', None)
                 ]
+        elif isinstance(chats, AsyncIterable):
+            # Chats are read while sending, so the audience is never kept in memory as a whole
+            self.chats = None
+            self._chats_stream = chats
         else:
             raise AttributeError(f'argument chats: expected {ChatsType}, got "{type(chats)}"')
 
+    async def _iter_chats(self) -> AsyncIterator[Dict]:
+        if self._chats_stream is None:
+            for chat in self.chats:
+                yield chat
+            return
+
+        try:
+            async for chat_id in self._chats_stream:
+                yield {'chat_id': chat_id, **self._chats_kwargs}
+        finally:
+            # Releases the cursor when the broadcast is stopped before the end
+            if hasattr(self._chats_stream, 'aclose'):
+                await self._chats_stream.aclose()
+
+    def _get_total(self) -> Union[int, str]:
+        return len(self.chats) if self.chats is not None else '?'
+
     @staticmethod
     def _chek_identical_keys(dicts: List) -> bool:
         for d in dicts[1:]:
@@ -159,21 +202,72 @@ class BaseBroadcaster(abc.ABC):
         else:
             BaseBroadcaster.running.remove(self)
 
+    @property
+    def messages_per_chat(self) -> int:
+        """Rate limit tokens used by one send"""
+        return 1
+
+    async def _send_chat(self, chat: Dict) -> bool:
+        chat_id, chat_args = self._parse_args(chat)
+        while True:
+            await self.rate_limiter.acquire(self.messages_per_chat)
+            try:
+                return await self.send(chat_id=chat_id, chat_args=chat_args)
+            except exceptions.RetryAfter as e:
+                # Flood limit is global for the bot, so every worker waits
+                self.logger.debug(f'Target [ID:{chat_id}]: Flood limit is exceeded. Sleep {e.timeout} seconds.')
+                self.rate_limiter.pause(e.timeout)
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            chat = await queue.get()
+            if self._stopped:
+                queue.task_done()
+                continue
+
+            try:
+                try:
+                    is_sent = await self._send_chat(chat)
+                except Exception:
+                    self.logger.exception(f'Target [ID:{chat.get("chat_id")}]: failed')
+                    is_sent = False
+
+                self._processed_count += 1
+                if is_sent:
+                    self._sent_count += 1
+                if self.keep_results:
+                    (self._successful if is_sent else self._failure).append(chat)
+                if self.on_result:
+                    await self.on_result(chat, is_sent)
+            except Exception:
+                self.logger.exception(f'Result of target [ID:{chat.get("chat_id")}] was not saved')
+            finally:
+                queue.task_done()
+
     async def _start_broadcast(self) -> None:
-        for chat in self.chats:
-            logging.info(str(self))
-            chat_id, chat_args = self._parse_args(chat)
-            if await self.send(chat_id=chat_id, chat_args=chat_args):
-                self._successful.append(chat)
-            else:
-                self._failure.append(chat)
-            await asyncio.sleep(self.timeout)
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+        try:
+            async with aclosing(self._iter_chats()) as chats:
+                async for chat in chats:
+                    if self._stopped:
+                        break
+                    await queue.put(chat)
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    def stop(self) -> None:
+        """Sends in progress are finished, other chats are left untouched"""
+        self._stopped = True
 
     async def run(self) -> None:
         self._change_running_status(True)
         await self._start_broadcast()
         self._change_running_status(False)
-        logging.info(f'{len(self._successful)}/{len(self.chats)} messages were sent out')
+        logging.info(f'{self._sent_count}/{self._processed_count} messages were sent out')
 
     async def close_bot(self) -> None:
         logging.warning('GOODBYE')
@@ -0,0 +1,216 @@
+import asyncio
+import datetime
+import logging
+from typing import AsyncIterator
+
+from aiogram import Bot
+from aiogram.types import Message, MediaGroup
+
+from tgbot.services.database.models import BroadcastJob, TelegramUser
+from tgbot.services.lease import RedisLease
+from .message_with_media_group import MessageBroadcasterWithMediaGroup
+
+FINISHED_STATUSES = ('done', 'cancelled', 'failed')
+
+
+async def get_progress(redis, job: BroadcastJob) -> dict:
+    """Live counters of a running job, saved ones otherwise"""
+    sent, failed = await redis.hmget(f'broadcast:{job.id}', 'sent', 'failed')
+    return {
+        'sent': int(sent) if sent is not None else job.sent or 0,
+        'failed': int(failed) if failed is not None else job.failed or 0,
+        'total': job.total
+    }
+
+
+class BroadcastWorker:
+    """
+    Runs mailings stored in BroadcastJob one by one.
+
+    Every processed recipient is added to a redis set, so after a restart or a pause
+    the job continues from where it stopped. Only the replica holding the "broadcast" lease works.
+    """
+
+    def __init__(self, bot: Bot, redis, database, interval: float = 5, checkpoint_ttl: int = 7 * 24 * 60 * 60,
+                 max_errors: int = 3):
+        self.bot = bot
+        self.redis = redis
+        self.database = database
+        self.interval = interval
+        self.checkpoint_ttl = checkpoint_ttl
+        self.max_errors = max_errors
+        self.lease = RedisLease(redis, 'broadcast', ttl=60)
+
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+        await self.lease.release()
+
+    async def process(self) -> bool:
+        async with self.database() as session:
+            job = await BroadcastJob.get_next(session)
+            if job is None:
+                return False
+
+            job.status = 'running'
+            job.total = await TelegramUser.count_audience(session)
+            await session.commit()
+
+        done = await self.redis.scard(f'broadcast:{job.id}:done')
+        logging.info(f'Broadcast {job.id} started, {done} of {job.total} chats are already processed')
+
+        try:
+            await self._run(job)
+        except Exception as e:
+            logging.exception(f'Broadcast {job.id} failed: {e}')
+            await self._save_error(job.id, e)
+            return False
+
+        await self._finish(job.id)
+        return True
+
+    async def _run(self, job: BroadcastJob):
+        broadcaster = MessageBroadcasterWithMediaGroup(
+            chats=self._get_pending_chats(job.id),
+            message=Message.to_object(job.message),
+            media_group=self._get_media_group(job.media_group),
+            bot=self.bot,
+            on_result=lambda chat, is_sent: self._save_result(job.id, chat['chat_id'], is_sent),
+            keep_results=False
+        )
+        watcher = asyncio.create_task(self._watch(job.id, broadcaster))
+        try:
+            await broadcaster.run()
+        finally:
+            watcher.cancel()
+            await asyncio.gather(watcher, return_exceptions=True)
+            await self._save_unreachable(job.id, broadcaster)
+
+    async def _save_error(self, job_id: int, error: Exception):
+        """Running job is taken first, so the one that keeps failing is stopped not to block others"""
+        errors = await self.redis.hincrby(f'broadcast:{job_id}', 'errors', 1)
+        if errors < self.max_errors:
+            return
+
+        async with self.database() as session:
+            job = await session.get(BroadcastJob, job_id)
+            if job.status != 'running':
+                return
+            job.status = 'failed'
+            await session.commit()
+
+        await self._finish(job_id, error=repr(error))
+
+    async def _get_pending_chats(self, job_id: int) -> AsyncIterator[int]:
+        """Streams the audience skipping chats processed before a restart or a pause"""
+        async with self.database() as session:
+            async for chat_ids in TelegramUser.stream_audience(session):
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for chat_id in chat_ids:
+                        pipe.sismember(f'broadcast:{job_id}:done', chat_id)
+                    is_done = await pipe.execute()
+
+                for chat_id, chat_is_done in zip(chat_ids, is_done):
+                    if not chat_is_done:
+                        yield chat_id
+
+    async def _save_result(self, job_id: int, chat_id: int, is_sent: bool):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.sadd(f'broadcast:{job_id}:done', chat_id)
+            pipe.hincrby(f'broadcast:{job_id}', 'sent' if is_sent else 'failed', 1)
+            pipe.expire(f'broadcast:{job_id}:done', self.checkpoint_ttl)
+            pipe.expire(f'broadcast:{job_id}', self.checkpoint_ttl)
+            await pipe.execute()
+
+    async def _save_unreachable(self, job_id: int, broadcaster: MessageBroadcasterWithMediaGroup):
+        chat_ids = broadcaster.pop_unreachable()
+        if not chat_ids:
+            return
+
+        try:
+            async with self.database() as session:
+                await TelegramUser.mark_unreachable(session, chat_ids)
+                await session.commit()
+            await self.redis.hincrby(f'broadcast:{job_id}', 'unreachable', len(chat_ids))
+        except Exception as e:
+            logging.warning(f'Unreachable chats of broadcast {job_id} were not saved: {e}')
+
+    async def _watch(self, job_id: int, broadcaster: MessageBroadcasterWithMediaGroup):
+        """Stops the broadcaster when admin pauses or cancels the job, or the lease is lost"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                async with self.database() as session:
+                    job = await session.get(BroadcastJob, job_id)
+                    status = job.status
+                is_held = await self.lease.acquire()
+                await self._save_unreachable(job_id, broadcaster)
+            except Exception as e:
+                logging.warning(f'Broadcast {job_id} status was not checked: {e}')
+                continue
+
+            if status != 'running' or not is_held:
+                logging.info(f'Broadcast {job_id} is stopped: status={status}, lease_held={is_held}')
+                broadcaster.stop()
+                return
+
+    async def _finish(self, job_id: int, error: str = None):
+        progress_sent, progress_failed, unreachable = await self.redis.hmget(
+            f'broadcast:{job_id}', 'sent', 'failed', 'unreachable'
+        )
+        async with self.database() as session:
+            job = await session.get(BroadcastJob, job_id)
+            job.sent = int(progress_sent or 0)
+            job.failed = int(progress_failed or 0)
+            if job.status == 'running' and job.sent + job.failed >= job.total:
+                job.status = 'done'
+            if job.status in FINISHED_STATUSES:
+                job.finished_at = datetime.datetime.now()
+            await session.commit()
+
+        logging.info(f'Broadcast {job_id} is {job.status}: {job.sent} sent, {job.failed} failed of {job.total}')
+        if job.status in FINISHED_STATUSES and job.created_by:
+            await self._send_summary(job, int(unreachable or 0), error)
+
+    async def _send_summary(self, job: BroadcastJob, unreachable: int, error: str = None):
+        results = {'done': 'завершена', 'cancelled': 'отменена', 'failed': 'остановлена из-за ошибки'}
+        text = (f'Рассылка #{job.id} {results[job.status]}\n\n'
+                f'Отправлено: {job.sent} из {job.total}\n'
+                f'Ошибок: {job.failed}, из них недоступных чатов: {unreachable}\n'
+                f'Недоступные пользователи исключены из следующих рассылок')
+        if error:
+            text += f'\n\nОшибка: {error}'
+        try:
+            await self.bot.send_message(job.created_by, text, parse_mode=None)
+        except Exception as e:
+            logging.warning(f'Summary of broadcast {job.id} was not sent: {e}')
+
+    @staticmethod
+    def _get_media_group(medias: list[dict] | None) -> MediaGroup | None:
+        if not medias:
+            return None
+
+        media_group = MediaGroup()
+        media_group.attach_many(*medias)
+        return media_group
+
+    async def _loop(self):
+        # Copied messages take the bot from context
+        Bot.set_current(self.bot)
+        while True:
+            try:
+                if await self.lease.acquire() and await self.process():
+                    continue
+            except Exception as e:
+                logging.exception(f'Broadcast processing failed: {e}')
+
+            await asyncio.sleep(self.interval)
@@ -1,7 +1,5 @@
-from asyncio import sleep
-from copy import deepcopy
 from string import Template
-from typing import Dict, Optional
+from typing import Awaitable, Callable, Dict, Optional
 
 from aiogram import Bot
 from aiogram.types import Message, ParseMode, MediaGroup
@@ -23,7 +21,10 @@ class MessageBroadcasterWithMediaGroup(BaseBroadcaster):
             reply_markup: MarkupType = None,
             bot: Optional[Bot] = None,
             bot_token: Optional[str] = None,
-            timeout: float = 0.02,
+            rate: float = 25,
+            concurrency: int = 20,
+            on_result: Optional[Callable[[Dict, bool], Awaitable]] = None,
+            keep_results: bool = True,
             media_group: MediaGroup = None,
             logger=__name__
     ):
@@ -36,16 +37,53 @@ class MessageBroadcasterWithMediaGroup(BaseBroadcaster):
             reply_markup=reply_markup,
             bot=bot,
             bot_token=bot_token,
-            timeout=timeout,
+            rate=rate,
+            concurrency=concurrency,
+            on_result=on_result,
+            keep_results=keep_results,
             logger=logger,
         )
         self.message = message
         self.media_group = media_group
+        self._setup_text(message)
+
+    def _setup_text(self, message: Message) -> None:
+        """Renders HTML and parses the template once, not for every chat"""
+        self.template: Optional[Template] = None
+        if not (message.text or message.caption):
+            self.text = None
+            return
+
+        template = Template(message.html_text)
+        if self._has_placeholders(template):
+            self.text = None
+            self.template = template
+        else:
+            # safe_substitute also turns "$$" into "$", so the result is the same for every chat
+            self.text = template.safe_substitute()
+
+    @staticmethod
+    def _has_placeholders(template: Template) -> bool:
+        return any(
+            match.group('named') or match.group('braced')
+            for match in template.pattern.finditer(template.template)
+        )
+
+    def get_text(self, text_args: dict) -> Optional[str]:
+        if self.template is None:
+            return self.text
+
+        return self.template.safe_substitute(text_args)
+
+    @property
+    def messages_per_chat(self) -> int:
+        return len(self.media_group.media) if self.media_group else 1
 
     @staticmethod
     async def send_copy(
             message: Message,
             chat_id: ChatIdType,
+            text: Optional[str] = None,
             disable_notification: Optional[bool] = None,
             disable_web_page_preview: Optional[bool] = None,
             reply_to_message_id: Optional[int] = None,
@@ -60,13 +98,6 @@ class MessageBroadcasterWithMediaGroup(BaseBroadcaster):
             "disable_notification": disable_notification,
             "reply_to_message_id": reply_to_message_id,
         }
-        if message.caption:
-            text = message.caption
-        elif message.text:
-            text = message.text
-        else:
-            text = None
-
         if message.text:
             kwargs["disable_web_page_preview"] = disable_web_page_preview
             return await message.bot.send_message(text=text, **kwargs)
@@ -154,19 +185,6 @@ class MessageBroadcasterWithMediaGroup(BaseBroadcaster):
         else:
             raise TypeError("This type of message can't be copied.")
 
-    @staticmethod
-    def get_updated_message(message: Message, text_args: dict) -> Message:
-        msg = deepcopy(message)
-        text = Template(msg.html_text).safe_substitute(text_args) if (msg.text or msg.caption) else None
-        if msg.caption:
-            msg.caption = text
-        elif msg.text:
-            msg.text = text
-        else:
-            return message
-
-        return msg
-
     async def send(
             self,
             chat_id: ChatIdType,
@@ -180,29 +198,25 @@ class MessageBroadcasterWithMediaGroup(BaseBroadcaster):
                 )
                 self.logger.debug(f"Target [ID:{chat_id}]: success")
                 return True
-            msg = self.get_updated_message(self.message, chat_args)
             await self.send_copy(
-                message=msg,
+                message=self.message,
                 chat_id=chat_id,
+                text=self.get_text(chat_args),
                 disable_notification=self.disable_notification,
                 disable_web_page_preview=self.disable_web_page_preview,
                 reply_to_message_id=self.reply_to_message_id,
                 allow_sending_without_reply=self.allow_sending_without_reply,
                 reply_markup=self.reply_markup,
             )
-        except exceptions.RetryAfter as e:
-            self.logger.debug(
-                f"Target [ID:{chat_id}]: Flood limit is exceeded. Sleep {e.timeout} seconds."
-            )
-            await sleep(e.timeout)
-            return await self.send(chat_id, chat_args)  # Recursive call
+        except exceptions.RetryAfter:
+            raise  # Handled by the broadcaster for all chats at once
         except (
                 exceptions.BotBlocked,
                 exceptions.ChatNotFound,
-                exceptions.UserDeactivated,
-                exceptions.ChatNotFound
+                exceptions.UserDeactivated
         ) as e:
             self.logger.debug(f"Target [ID:{chat_id}]: {e.match}")
+            self._unreachable.append(chat_id)
         except exceptions.TelegramAPIError:
             self.logger.exception(f"Target [ID:{chat_id}]: failed")
         else:
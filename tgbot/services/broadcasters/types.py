@@ -1,11 +1,11 @@
 from string import Template
-from typing import Dict, List, Union
+from typing import AsyncIterable, Dict, List, Union
 
 from aiogram.types import (ForceReply, InlineKeyboardMarkup,
                            ReplyKeyboardMarkup, ReplyKeyboardRemove)
 
 ChatIdType = Union[int, str]
-ChatsType = Union[Union[List[ChatIdType], ChatIdType], List[Dict]]
+ChatsType = Union[Union[List[ChatIdType], ChatIdType], List[Dict], AsyncIterable[ChatIdType]]
 TextType = Union[Template, str]
 MarkupType = Union[
     InlineKeyboardMarkup,
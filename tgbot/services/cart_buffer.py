@@ -0,0 +1,71 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Hashable
+
+ApplyDelta = Callable[[int], Awaitable]
+
+
+@dataclass
+class _PendingDelta:
+    delta: int
+    apply: ApplyDelta
+    timer: asyncio.TimerHandle | None = None
+
+
+class QuantityBuffer:
+    """
+    Collects fast quantity taps on one cart line and applies their sum once.
+
+    Every tap restarts the timer, after `delay` seconds without taps the last passed
+    `apply` is called with the summed delta. Calls for one key never run concurrently.
+    """
+
+    def __init__(self, delay: float = 0.6):
+        self.delay = delay
+
+        self._pending: dict[Hashable, _PendingDelta] = dict()
+        self._locks: dict[Hashable, tuple[asyncio.Lock, int]] = dict()
+        self._tasks: set[asyncio.Task] = set()
+
+    def add(self, key: Hashable, delta: int, apply: ApplyDelta):
+        pending = self._pending.get(key)
+        if pending:
+            pending.timer.cancel()
+            pending.delta += delta
+            pending.apply = apply
+        else:
+            pending = self._pending[key] = _PendingDelta(delta, apply)
+
+        pending.timer = asyncio.get_running_loop().call_later(self.delay, self._flush, key)
+
+    async def close(self):
+        for key in list(self._pending):
+            self._pending[key].timer.cancel()
+            self._flush(key)
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _flush(self, key: Hashable):
+        pending = self._pending.pop(key)
+        task = asyncio.create_task(self._apply(key, pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _apply(self, key: Hashable, pending: _PendingDelta):
+        if not pending.delta:
+            return
+
+        lock, users = self._locks.get(key, (asyncio.Lock(), 0))
+        self._locks[key] = (lock, users + 1)
+        try:
+            async with lock:
+                await pending.apply(pending.delta)
+        except Exception as e:
+            logging.exception(f'Quantity change {pending.delta} for {key} was not applied: {e}')
+        finally:
+            lock, users = self._locks[key]
+            if users == 1:
+                del self._locks[key]
+            else:
+                self._locks[key] = (lock, users - 1)
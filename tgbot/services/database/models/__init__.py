@@ -1,7 +1,10 @@
 from .telegram_user import TelegramUser
 from .iiko_user import IikoUser
-from .cart import Cart
+from .cart import Cart, CartContents
 from .order import OrderProduct, Order
 from .group import Group
 from .product import Product
 from .organization import Organization
+from .outbox import OrderOutbox
+from .saved_address import SavedAddress
+from .broadcast_job import BroadcastJob
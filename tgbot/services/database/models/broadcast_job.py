@@ -0,0 +1,42 @@
+import datetime
+
+from sqlalchemy import Column, BigInteger, DateTime, String, Integer, select
+from sqlalchemy.dialects.postgresql import JSONB
+
+from tgbot.services.database.base import Base
+
+
+class BroadcastJob(Base):
+    """Mailing processed by BroadcastWorker, survives restarts"""
+    __tablename__ = 'broadcast_job'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    status = Column(String(16), default='pending', nullable=False, index=True)  # "pending" "running" "paused" "cancelled" "done" "failed"
+    message = Column(JSONB, nullable=False)
+    media_group = Column(JSONB)
+    created_by = Column(BigInteger)
+    total = Column(Integer)
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    created_at = Column(DateTime(), default=datetime.datetime.now, nullable=False)
+    finished_at = Column(DateTime())
+
+    @classmethod
+    async def get_next(cls, session) -> 'BroadcastJob | None':
+        """Interrupted job goes first, then the oldest pending one"""
+        stmt = (
+            select(BroadcastJob)
+            .where(BroadcastJob.status.in_(('running', 'pending')))
+            .order_by(BroadcastJob.status.desc(), BroadcastJob.id)
+            .limit(1)
+        )
+        record = await session.execute(stmt)
+
+        return record.scalar()
+
+    @classmethod
+    async def get_last(cls, session, limit: int = 5) -> list['BroadcastJob']:
+        stmt = select(BroadcastJob).order_by(BroadcastJob.id.desc()).limit(limit)
+        records = await session.execute(stmt)
+
+        return records.scalars().all()
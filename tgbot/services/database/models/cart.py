@@ -1,10 +1,24 @@
 import datetime
+from dataclasses import dataclass
 
-from sqlalchemy import Column, BigInteger, DateTime, String, UUID, ForeignKey, Integer, select, delete
-from sqlalchemy.orm import relationship, backref
+from sqlalchemy import Column, BigInteger, DateTime, String, UUID, ForeignKey, Integer, select, delete, update, func
+from sqlalchemy.orm import relationship, backref, contains_eager
 from sqlalchemy.sql.expression import text
 
 from tgbot.services.database.base import Base
+from tgbot.services.database.models.iiko_user import IikoUser
+from tgbot.services.database.models.product import Product
+
+
+@dataclass
+class CartContents:
+    lines: list['Cart']
+    total_sum: float
+    position: int | None = None  # Position of the requested line, starts from 1
+
+    @property
+    def current(self) -> 'Cart | None':
+        return self.lines[self.position - 1] if self.position else None
 
 
 class Cart(Base):
@@ -19,9 +33,51 @@ class Cart(Base):
     iiko_user = relationship('IikoUser', backref=backref('cart_products', order_by='desc(Cart.id)'))
 
     @classmethod
-    async def clear_old_products(cls, session, user_id, revision):
-        stmt = delete(Cart).where(Cart.iiko_user_id == user_id, Cart.product.revision != revision)
-        await session.execute(stmt)
+    def _telegram_user_filter(cls, telegram_id: int):
+        return Cart.iiko_user_id == select(IikoUser.id).where(IikoUser.telegram_id == telegram_id).scalar_subquery()
+
+    @classmethod
+    async def get_user_cart(cls, session, telegram_id: int, current_id: int = None) -> CartContents:
+        """Loads all cart lines with their products and the total sum in one query"""
+        stmt = (
+            select(Cart, func.sum(Cart.quantity * Product.price).over())
+            .join(Cart.product)
+            .options(contains_eager(Cart.product))
+            .where(cls._telegram_user_filter(telegram_id))
+            .order_by(Cart.id.desc())
+        )
+        records = (await session.execute(stmt)).all()
+
+        lines = [record[0] for record in records]
+        total_sum = records[0][1] if records else 0
+        position = next((ind + 1 for ind, line in enumerate(lines) if line.id == current_id), None)
+
+        return CartContents(lines=lines, total_sum=total_sum, position=position)
+
+    @classmethod
+    async def change_quantity(cls, session, cart_id: int, delta: int) -> int | None:
+        """Returns new quantity or None if there is no such line. Line is deleted when quantity drops to zero"""
+        stmt = update(Cart).where(Cart.id == cart_id).values(quantity=Cart.quantity + delta).returning(Cart.quantity)
+        quantity = (await session.execute(stmt)).scalar()
+        if quantity is not None and quantity <= 0:
+            await session.execute(delete(Cart).where(Cart.id == cart_id))
+
+        return quantity
+
+    @classmethod
+    async def remove(cls, session, cart_id: int) -> bool:
+        stmt = delete(Cart).where(Cart.id == cart_id).returning(Cart.id)
+        return (await session.execute(stmt)).scalar() is not None
+
+    @classmethod
+    async def clear_old_products(cls, session, telegram_id: int, revision):
+        stmt = delete(Cart).where(
+            cls._telegram_user_filter(telegram_id),
+            Cart.product_id.in_(select(Product.id).where(Product.revision != revision))
+        ).returning(Cart.id)
+        records = await session.execute(stmt)
+
+        return records.scalars().all()
 
     @classmethod
     async def get_user_product(cls, session, user_id, product_id):
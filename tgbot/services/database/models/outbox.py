@@ -0,0 +1,44 @@
+import datetime
+
+from sqlalchemy import Column, BigInteger, DateTime, String, Integer, Text, select
+from sqlalchemy.dialects.postgresql import JSONB
+
+from tgbot.services.database.base import Base
+
+
+class OrderOutbox(Base):
+    """iiko requests written together with the order and submitted later by OutboxWorker"""
+    __tablename__ = 'order_outbox'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    kind = Column(String(32), nullable=False)  # "delivery" "reserve"
+    payload = Column(JSONB, nullable=False)
+    telegram_id = Column(BigInteger)
+    status = Column(String(32), default='pending', nullable=False, index=True)  # "pending" "sent" "failed"
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime(), default=datetime.datetime.now, nullable=False)
+    last_error = Column(Text)
+    created_at = Column(DateTime(), default=datetime.datetime.now, nullable=False)
+    sent_at = Column(DateTime())
+
+    @classmethod
+    def create(cls, session, kind: str, request, telegram_id: int = None) -> 'OrderOutbox':
+        """Adds the pydantic request to the session, it is committed with the caller's transaction"""
+        record = OrderOutbox(kind=kind, payload=request.model_dump(mode='json'), telegram_id=telegram_id)
+        session.add(record)
+
+        return record
+
+    @classmethod
+    async def get_due(cls, session, limit: int) -> list['OrderOutbox']:
+        """Locks due records, records locked by other workers are skipped"""
+        stmt = (
+            select(OrderOutbox)
+            .where(OrderOutbox.status == 'pending', OrderOutbox.next_attempt_at <= datetime.datetime.now())
+            .order_by(OrderOutbox.next_attempt_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        records = await session.execute(stmt)
+
+        return records.scalars().all()
@@ -0,0 +1,112 @@
+import datetime
+
+from sqlalchemy import Column, BigInteger, DateTime, String, UUID, ForeignKey, Double, select, delete
+from sqlalchemy.orm import relationship, backref
+
+from tgbot.services.database.base import Base
+from tgbot.services.database.models.iiko_user import IikoUser
+
+ADDRESS_FIELDS = ('city', 'street', 'house', 'entrance', 'floor', 'flat', 'latitude', 'longitude')
+
+
+class SavedAddress(Base):
+    __tablename__ = 'saved_address'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    iiko_user_id = Column(UUID, ForeignKey('iiko_user.id'), index=True)
+    city = Column(String(64))
+    street = Column(String(64))
+    house = Column(String(16))
+    entrance = Column(String(16))
+    floor = Column(String(16))
+    flat = Column(String(16))
+    latitude = Column(Double)
+    longitude = Column(Double)
+
+    # Result of the last successful suitability check
+    organization_id = Column(UUID)
+    terminal_group_id = Column(UUID)
+    delivery_product_id = Column(UUID)
+    checked_sum = Column(Double)  # Cart sum the address was allowed with
+    restrictions_version = Column(String(32))
+    last_used_at = Column(DateTime(), default=datetime.datetime.now)
+
+    iiko_user = relationship('IikoUser', backref=backref('saved_addresses', order_by='desc(SavedAddress.last_used_at)'))
+
+    @property
+    def title(self) -> str:
+        if self.house:
+            title = f'{self.street} {self.house}'
+        else:
+            title = '📍 Геопозиция'
+        if self.flat:
+            title += f', кв. {self.flat}'
+
+        return title
+
+    def to_state(self) -> dict:
+        data = {field: getattr(self, field) for field in ADDRESS_FIELDS if getattr(self, field) is not None}
+        data.update(
+            delivery='1',
+            organization=str(self.organization_id),
+            terminal_group=str(self.terminal_group_id),
+            delivery_product=str(self.delivery_product_id) if self.delivery_product_id else None
+        )
+
+        return data
+
+    @classmethod
+    async def get_user_addresses(cls, session, telegram_id: int, limit: int = 5) -> list['SavedAddress']:
+        stmt = (
+            select(SavedAddress)
+            .join(IikoUser, IikoUser.id == SavedAddress.iiko_user_id)
+            .where(IikoUser.telegram_id == telegram_id)
+            .order_by(SavedAddress.last_used_at.desc())
+            .limit(limit)
+        )
+        records = await session.execute(stmt)
+
+        return records.scalars().all()
+
+    @classmethod
+    async def get_user_address(cls, session, telegram_id: int, address_id: int) -> 'SavedAddress | None':
+        stmt = (
+            select(SavedAddress)
+            .join(IikoUser, IikoUser.id == SavedAddress.iiko_user_id)
+            .where(IikoUser.telegram_id == telegram_id, SavedAddress.id == address_id)
+        )
+        record = await session.execute(stmt)
+
+        return record.scalar()
+
+    @classmethod
+    async def save(cls, session, iiko_user_id, state_data: dict, limit: int = 5) -> 'SavedAddress':
+        """Updates the same address or adds a new one, only `limit` recent addresses are kept"""
+        address = {field: state_data.get(field) for field in ADDRESS_FIELDS}
+        stmt = select(SavedAddress).where(
+            SavedAddress.iiko_user_id == iiko_user_id,
+            *(getattr(SavedAddress, field).is_(None) if value is None else getattr(SavedAddress, field) == value
+              for field, value in address.items())
+        )
+        saved_address = (await session.execute(stmt)).scalars().first()
+        if saved_address is None:
+            saved_address = SavedAddress(iiko_user_id=iiko_user_id, **address)
+            session.add(saved_address)
+
+        saved_address.organization_id = state_data['organization']
+        saved_address.terminal_group_id = state_data['terminal_group']
+        saved_address.delivery_product_id = state_data.get('delivery_product')
+        saved_address.checked_sum = state_data.get('checked_sum')
+        saved_address.restrictions_version = state_data.get('restrictions_version')
+        saved_address.last_used_at = datetime.datetime.now()
+        await session.flush()
+
+        old_ids = (
+            select(SavedAddress.id)
+            .where(SavedAddress.iiko_user_id == iiko_user_id)
+            .order_by(SavedAddress.last_used_at.desc())
+            .offset(limit)
+        )
+        await session.execute(delete(SavedAddress).where(SavedAddress.id.in_(old_ids)))
+
+        return saved_address
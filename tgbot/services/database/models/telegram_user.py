@@ -1,6 +1,7 @@
 import datetime
+from typing import AsyncIterator
 
-from sqlalchemy import Column, BigInteger, DateTime, String, select, Boolean
+from sqlalchemy import Column, BigInteger, DateTime, String, select, update, Boolean, func
 from sqlalchemy.sql.expression import text
 
 from tgbot.services.database.base import Base
@@ -14,6 +15,8 @@ class TelegramUser(Base):
     is_admin = Column(Boolean, default=False)
     mention = Column(String(64))
     full_name = Column(String(64))
+    is_reachable = Column(Boolean, default=True, server_default=text('true'), nullable=False)
+    unreachable_since = Column(DateTime())  # When the bot was blocked or the account was deleted
 
     @classmethod
     async def get_all(cls, session):
@@ -21,3 +24,31 @@ class TelegramUser(Base):
         records = await session.execute(stmt)
 
         return records.scalars().all()
+
+    @classmethod
+    async def count_audience(cls, session) -> int:
+        stmt = select(func.count()).select_from(TelegramUser).where(TelegramUser.is_reachable)
+        record = await session.execute(stmt)
+
+        return record.scalar()
+
+    @classmethod
+    async def stream_audience(cls, session, chunk_size: int = 1000) -> AsyncIterator[list[int]]:
+        """Ids of users the bot still can write to, read from a server-side cursor chunk by chunk"""
+        stmt = (
+            select(TelegramUser.telegram_id)
+            .where(TelegramUser.is_reachable)
+            .execution_options(yield_per=chunk_size)
+        )
+        records = await session.stream_scalars(stmt)
+        async for chunk in records.partitions():
+            yield list(chunk)
+
+    @classmethod
+    async def mark_unreachable(cls, session, telegram_ids: list[int]):
+        stmt = (
+            update(TelegramUser)
+            .where(TelegramUser.telegram_id.in_(telegram_ids), TelegramUser.is_reachable)
+            .values(is_reachable=False, unreachable_since=datetime.datetime.now())
+        )
+        await session.execute(stmt)
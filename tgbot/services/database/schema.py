@@ -0,0 +1,17 @@
+from sqlalchemy import text
+
+from tgbot.services.database import models  # noqa: F401, registers all tables in metadata
+from tgbot.services.database.base import Base
+
+# create_all skips existing tables, so columns added to them later have to be listed here
+ADDED_COLUMNS = (
+    'ALTER TABLE telegram_user ADD COLUMN IF NOT EXISTS is_reachable BOOLEAN NOT NULL DEFAULT true',
+    'ALTER TABLE telegram_user ADD COLUMN IF NOT EXISTS unreachable_since TIMESTAMP WITHOUT TIME ZONE',
+)
+
+
+async def create_schema(engine):
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        for statement in ADDED_COLUMNS:
+            await connection.execute(text(statement))
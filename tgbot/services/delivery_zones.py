@@ -0,0 +1,227 @@
+import bisect
+import hashlib
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass
+
+from tgbot.services.iiko.api import Iiko
+from tgbot.services.iiko.schemas import (DeliveryRestrictionsResult, AllowedItem, SuitableTerminalGroupsRequest,
+                                         DeliveryAddress, Coordinates)
+
+
+class ZonePolygon:
+    def __init__(self, points: list[tuple[float, float]]):
+        self.points = points  # (latitude, longitude)
+
+        latitudes = [point[0] for point in points]
+        longitudes = [point[1] for point in points]
+        self.bbox = (min(latitudes), min(longitudes), max(latitudes), max(longitudes))
+
+    def contains(self, latitude: float, longitude: float) -> bool:
+        min_lat, min_lon, max_lat, max_lon = self.bbox
+        if not (min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon):
+            return False
+
+        # Ray casting: the point is inside if a ray from it crosses the border odd number of times
+        inside = False
+        prev_lat, prev_lon = self.points[-1]
+        for lat, lon in self.points:
+            if (lat > latitude) != (prev_lat > latitude):
+                crossing = lon + (latitude - lat) * (prev_lon - lon) / (prev_lat - lat)
+                if longitude < crossing:
+                    inside = not inside
+            prev_lat, prev_lon = lat, lon
+
+        return inside
+
+
+@dataclass
+class ZoneRule:
+    polygon: ZonePolygon
+    organization_id: str
+    terminal_group_id: str
+    zone: str
+    min_sum: float
+    duration: int
+    delivery_product_id: str | None
+    priority: int
+
+
+class DeliveryZoneIndex:
+    """Delivery restriction rules of all organizations with their zone polygons"""
+
+    def __init__(self, restrictions: DeliveryRestrictionsResult):
+        self.rules: list[ZoneRule] = list()
+        min_sums = set()
+
+        for restriction in restrictions.deliveryRestrictions:
+            polygons = {
+                zone.name: ZonePolygon([(point.latitude, point.longitude) for point in zone.coordinates])
+                for zone in restriction.deliveryZones if len(zone.coordinates) >= 3
+            }
+
+            for item in restriction.restrictions:
+                min_sum = restriction.defaultMinSum if restriction.useSameMinSum else item.minSum
+                min_sums.add(min_sum or 0)
+
+                polygon = polygons.get(item.zone)
+                if polygon is None:
+                    continue
+
+                product_id = (restriction.defaultDeliveryServiceProductId if restriction.useSameDeliveryServiceProduct
+                              else item.deliveryServiceProductId)
+                self.rules.append(ZoneRule(
+                    polygon=polygon,
+                    organization_id=item.organizationId,
+                    terminal_group_id=item.terminalGroupId,
+                    zone=item.zone,
+                    min_sum=min_sum or 0,
+                    duration=item.deliveryDurationInMinutes or restriction.defaultDeliveryDurationInMinutes or 0,
+                    delivery_product_id=product_id,
+                    priority=item.priority or 0
+                ))
+
+        self.rules.sort(key=lambda rule: rule.priority)
+        # Zones without polygons count too, iiko checks their min sums for text addresses
+        self.min_sums = sorted(min_sums)
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def find(self, latitude: float, longitude: float, delivery_sum: float) -> AllowedItem | None:
+        for rule in self.rules:
+            if rule.min_sum <= delivery_sum and rule.polygon.contains(latitude, longitude):
+                return AllowedItem(
+                    terminalGroupId=rule.terminal_group_id,
+                    organizationId=rule.organization_id,
+                    deliveryDurationInMinutes=rule.duration,
+                    zone=rule.zone,
+                    deliveryServiceProductId=rule.delivery_product_id
+                )
+
+        return None
+
+    def get_sum_bucket(self, delivery_sum: float) -> int:
+        """Sums with the same bucket pass the same min sum checks"""
+        return bisect.bisect_right(self.min_sums, delivery_sum)
+
+
+def normalize_address_part(value: str) -> str:
+    value = value.lower().replace('ё', 'е')
+    value = re.sub(r'\b(г|город|ул|улица|д|дом)\b\.?', ' ', value)
+    value = re.sub(r'[.,"\']', ' ', value)
+    return ' '.join(value.split())
+
+
+class DeliveryZoneResolver:
+    """
+    Decides where an address can be delivered from.
+
+    Locations are checked against cached zone polygons without iiko,
+    text addresses still need iiko geocoding, but organization ids are cached.
+    """
+
+    def __init__(self, iiko: Iiko, redis, ttl: int = 60 * 60, address_ttl: int = 24 * 60 * 60):
+        self.iiko = iiko
+        self.redis = redis
+        self.ttl = ttl
+        self.address_ttl = address_ttl
+
+        self.version: str | None = None
+        self._index: DeliveryZoneIndex | None = None
+        self._expires_at = 0.0
+
+    async def get_organization_ids(self) -> list[str]:
+        organization_ids = await self.redis.get('delivery:organizations')
+        if organization_ids:
+            return json.loads(organization_ids)
+
+        organizations = await self.iiko.get_organizations(False, False)
+        organization_ids = [str(org.id) for org in organizations.organizations]
+        await self.redis.set('delivery:organizations', json.dumps(organization_ids), ex=self.ttl)
+
+        return organization_ids
+
+    async def get_index(self) -> DeliveryZoneIndex:
+        if self._index is not None and time.monotonic() < self._expires_at:
+            return self._index
+
+        raw = await self.redis.get('delivery:restrictions')
+        if raw is None:
+            restrictions = await self.iiko.get_delivery_restrictions(await self.get_organization_ids())
+            raw = restrictions.model_dump_json()
+            await self.redis.set('delivery:restrictions', raw, ex=self.ttl)
+        else:
+            raw = raw.decode()
+
+        restrictions = DeliveryRestrictionsResult.model_validate_json(raw)
+        # correlationId is new in every iiko response, so only the zones make the version
+        zones = restrictions.model_dump_json(exclude={'correlationId'})
+        version = hashlib.sha1(zones.encode()).hexdigest()[:12]
+        if version != self.version:
+            self._index = DeliveryZoneIndex(restrictions)
+            self.version = version
+        self._expires_at = time.monotonic() + min(self.ttl, 60)
+
+        return self._index
+
+    async def get_version(self) -> str | None:
+        try:
+            await self.get_index()
+        except Exception as e:
+            logging.warning(f'Delivery zones were not loaded: {e}')
+
+        return self.version
+
+    async def resolve_location(self, latitude: float, longitude: float, delivery_sum: float) -> AllowedItem | None:
+        try:
+            index = await self.get_index()
+        except Exception as e:
+            logging.warning(f'Delivery zones were not loaded: {e}')
+            index = None
+
+        if index:
+            return index.find(latitude, longitude, delivery_sum)
+
+        # No polygons in iiko (or they are unavailable), let iiko decide
+        return await self._resolve(delivery_sum, location=Coordinates(latitude=latitude, longitude=longitude))
+
+    async def resolve_address(self, city: str, street: str, house: str, delivery_sum: float) -> AllowedItem | None:
+        cache_key = await self._get_address_key(city, street, house, delivery_sum)
+        if cache_key and (cached := await self.redis.get(cache_key)) is not None:
+            return AllowedItem.model_validate_json(cached) if cached else None
+
+        address = DeliveryAddress(city=city, streetName=street, house=house)
+        allowed_item = await self._resolve(delivery_sum, address=address)
+
+        if cache_key:
+            # Rejections may be caused by iiko geocoder hiccups, so they are kept shorter
+            await self.redis.set(cache_key, allowed_item.model_dump_json() if allowed_item else '',
+                                 ex=self.address_ttl if allowed_item else min(self.address_ttl, 10 * 60))
+
+        return allowed_item
+
+    async def _get_address_key(self, city: str, street: str, house: str, delivery_sum: float) -> str | None:
+        try:
+            index = await self.get_index()
+        except Exception as e:
+            logging.warning(f'Delivery zones were not loaded: {e}')
+            return None
+
+        # Version changes with restrictions, so old answers are not used after zones are edited
+        address = '|'.join(normalize_address_part(part) for part in (city, street, house))
+        return f'delivery:address:{self.version}:{address}:{index.get_sum_bucket(delivery_sum)}'
+
+    async def _resolve(self, delivery_sum: float, address: DeliveryAddress = None,
+                       location: Coordinates = None) -> AllowedItem | None:
+        result = await self.iiko.get_terminal_groups_for_delivery(SuitableTerminalGroupsRequest(
+            organizationIds=await self.get_organization_ids(),
+            deliveryAddress=address,
+            orderLocation=location,
+            isCourierDelivery=True,
+            deliverySum=delivery_sum
+        ))
+
+        return result.allowedItems[0] if result.allowedItems else None
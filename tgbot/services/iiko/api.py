@@ -1,25 +1,88 @@
-import datetime
 import logging
 from pprint import pprint
 
 import aiohttp
 
 from tgbot.services.iiko import schemas
+from tgbot.services.iiko.token import TokenManager
 
 
 class Iiko:
-    def __init__(self, api_login, default_organization_id, retries_count: int = 3):
+    def __init__(
+            self,
+            api_login,
+            default_organization_id,
+            retries_count: int = 3,
+            connections_limit: int = 20,
+            keepalive_timeout: float = 75,
+            dns_cache_ttl: int = 600,
+            request_timeout: float = 30,
+            redis=None
+    ):
         self.api_login = api_login
-        self.last_token_update = None
-        self.token = None
+        self.token_manager = TokenManager(self.get_new_token, redis=redis)
         self.retries_count = retries_count
         self.default_organization_id = default_organization_id
 
+        self.connections_limit = connections_limit
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.request_timeout = request_timeout
+        self._session: aiohttp.ClientSession | None = None
+        self._stats = {
+            'requests': 0,
+            'connections_created': 0,
+            'connections_reused': 0
+        }
+
         self.headers = {
-            'Authorization': 'Bearer {token}',
             'Content-Type': 'application/json'
         }
 
+    @property
+    def connection_stats(self) -> dict:
+        stats = dict(self._stats)
+        connections = stats['connections_created'] + stats['connections_reused']
+        stats['reuse_ratio'] = stats['connections_reused'] / connections if connections else 0
+        return stats
+
+    async def close(self):
+        await self.token_manager.close()
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        logging.info(f'Iiko session closed: {self.connection_stats}')
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_request_start.append(self._on_request_start)
+            trace_config.on_connection_create_end.append(self._on_connection_create)
+            trace_config.on_connection_reuseconn.append(self._on_connection_reuse)
+
+            connector = aiohttp.TCPConnector(
+                limit=self.connections_limit,
+                limit_per_host=self.connections_limit,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+                trace_configs=[trace_config]
+            )
+
+        return self._session
+
+    async def _on_request_start(self, session, context, params):
+        self._stats['requests'] += 1
+
+    async def _on_connection_create(self, session, context, params):
+        self._stats['connections_created'] += 1
+
+    async def _on_connection_reuse(self, session, context, params):
+        self._stats['connections_reused'] += 1
+
     async def create_reserve(self, request: schemas.CreateReserveRequest):
         url = 'https://api-ru.iiko.services/api/1/reserve/create'
         payload = request.model_dump()
@@ -45,13 +108,14 @@ class Iiko:
         result = await self._post_request(url, payload)
         return schemas.CalculateCheckinResult(**result)
 
-    async def get_delivery_restrictions(self, org_ids):
+    async def get_delivery_restrictions(self, org_ids) -> schemas.DeliveryRestrictionsResult:
         url = 'https://api-ru.iiko.services/api/1/delivery_restrictions'
         payload = {
             'organizationIds': org_ids
         }
 
-        return await self._post_request(url, payload)
+        result = await self._post_request(url, payload)
+        return schemas.DeliveryRestrictionsResult(**result)
 
     async def get_order_types(self, org_ids):
         url = 'https://api-ru.iiko.services/api/1/deliveries/order_types'
@@ -68,6 +132,16 @@ class Iiko:
         result = await self._post_request(url, payload)
         return result
 
+    async def get_deliveries_by_id(self, organization_id: str, order_ids: list[str]) -> schemas.DeliveriesResult:
+        url = 'https://api-ru.iiko.services/api/1/deliveries/by_id'
+        payload = {
+            'organizationId': organization_id,
+            'orderIds': order_ids
+        }
+
+        result = await self._post_request(url, payload)
+        return schemas.DeliveriesResult(**result)
+
     async def cancel_order(self, order_id, org_id):
         url = 'https://api-ru.iiko.services/api/1/deliveries/cancel'
         payload = {
@@ -182,15 +256,12 @@ class Iiko:
         return schemas.OrganizationsResult(**result)
 
     async def update_token(self) -> bool:
-        new_token = await self.get_new_token()
-        if isinstance(new_token, schemas.Error):
-            logging.error(str(new_token))
+        try:
+            await self.token_manager.refresh(force=True)
+        except schemas.ApiError as e:
+            logging.error(str(e))
             return False
 
-        self.token = new_token.token
-        self.headers['Authorization'] = f'Bearer {new_token.token}'
-        self.last_token_update = datetime.datetime.now()
-
         return True
 
     async def get_new_token(self) -> schemas.AccessTokenResult | schemas.Error:
@@ -212,36 +283,27 @@ class Iiko:
         if method not in ('POST', 'GET', 'PUT', 'DELETE', 'PATCH'):
             raise ValueError(f'Unknown method "{method}"')
 
-        if check_token and (not self.token or (datetime.datetime.now() - self.last_token_update < datetime.timedelta(minutes=55))):
-            result = await self.update_token()
-            if not result:
-                raise schemas.ApiError('Error during updating token. See error in previous log')
-
-        async with aiohttp.ClientSession(headers=self.headers) as session:
-            match method:
-                case 'POST':
-                    request = session.post
-                case 'GET':
-                    request = session.get
-                case 'PUT':
-                    request = session.put
-                case 'DELETE':
-                    request = session.delete
-                case 'PATCH':
-                    request = session.patch
-
-            async with request(url, **kwargs) as response:
-                if not response.ok:
-                    if retires > self.retries_count:
-                        raise schemas.ApiError(f'{response.status}, {await response.text()}')
-
-                    if response.status in (401, 408, 500):
-                        if response.status == 401:
-                            await self.update_token()
-                        await self._request(method, url, check_token, retires + 1, **kwargs)
-                    else:
-                        raise schemas.ApiError(f'{response.status}, {await response.text()}')
-
-                json_resp = await response.json()
-
-        return json_resp
+        headers = self.headers
+        if check_token:
+            try:
+                token = await self.token_manager.get_token()
+            except schemas.ApiError as e:
+                raise schemas.ApiError(f'Error during updating token: {e}')
+            headers = {**headers, 'Authorization': f'Bearer {token}'}
+
+        session = self._get_session()
+        async with session.request(method, url, headers=headers, **kwargs) as response:
+            if response.ok:
+                return await response.json()
+
+            status, text = response.status, await response.text()
+
+        if retires > self.retries_count or status not in (401, 408, 500):
+            raise schemas.ApiError(f'{status}, {text}')
+        if status == 401 and not check_token:
+            # The token request itself was rejected, refreshing the token would wait for this very request
+            raise schemas.ApiError(f'{status}, {text}')
+
+        if status == 401:
+            await self.update_token()
+        return await self._request(method, url, check_token, retires + 1, **kwargs)
@@ -154,6 +154,37 @@ class AllowedItem(BaseModel):
     deliveryServiceProductId: str | None = None
 
 
+class DeliveryZone(BaseModel):
+    name: str
+    coordinates: list[Coordinates]
+
+
+class DeliveryRestrictionItem(BaseModel):
+    minSum: float | None = None
+    terminalGroupId: str
+    organizationId: str
+    zone: str | None = None
+    priority: int | None = None
+    deliveryDurationInMinutes: int | None = None
+    deliveryServiceProductId: str | None = None
+
+
+class DeliveryRestriction(BaseModel):
+    organizationId: str
+    defaultDeliveryDurationInMinutes: int | None = None
+    defaultMinSum: float | None = None
+    useSameMinSum: bool | None = None
+    defaultDeliveryServiceProductId: str | None = None
+    useSameDeliveryServiceProduct: bool | None = None
+    restrictions: list[DeliveryRestrictionItem]
+    deliveryZones: list[DeliveryZone]
+
+
+class DeliveryRestrictionsResult(BaseModel):
+    correlationId: str
+    deliveryRestrictions: list[DeliveryRestriction]
+
+
 class RejectItemData(BaseModel):
     dateFrom: str | None = None
     dateTo: str | None = None
@@ -495,6 +526,24 @@ class CreateReserveResult(BaseModel):
     reserveInfo: ReserveInfo
 
 
+class DeliveryStatus(BaseModel):
+    status: str  # "Unconfirmed" "WaitCooking" "ReadyForCooking" "CookingStarted" "CookingCompleted" "Waiting" "OnWay" "Delivered" "Closed" "Cancelled"
+
+
+class DeliveryInfo(BaseModel):
+    id: str
+    organizationId: str
+    timestamp: int
+    creationStatus: str  # "Success" "InProgress" "Error"
+    errorInfo: ErrorInfo | None = None
+    order: DeliveryStatus | None = None
+
+
+class DeliveriesResult(BaseModel):
+    correlationId: str
+    orders: list[DeliveryInfo]
+
+
 class Reserve(BaseModel):
     id: str
     tableIds: list[str]
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+from tgbot.services.iiko import schemas
+
+
+class TokenManager:
+    """
+    Keeps iiko access token fresh.
+
+    Token is refreshed in background before it expires, concurrent callers share one in-flight refresh
+    and, if redis is passed, the token is shared between all bot replicas.
+    """
+
+    def __init__(
+            self,
+            fetch_token: Callable[[], Awaitable[schemas.AccessTokenResult]],
+            redis=None,
+            lifetime: int = 60 * 60,
+            refresh_margin: int = 5 * 60,
+            redis_key: str = 'iiko_token',
+            lock_timeout: int = 15
+    ):
+        self._fetch_token = fetch_token
+        self.redis = redis
+        self.lifetime = lifetime
+        self.refresh_margin = refresh_margin
+        self.redis_key = redis_key
+        self.lock_timeout = lock_timeout
+
+        self.token: str | None = None
+        self.expires_at: float = 0
+
+        self._refresh_future: asyncio.Future | None = None
+        self._refresh_is_forced: bool = False
+        self._background_task: asyncio.Task | None = None
+
+    @property
+    def refresh_at(self) -> float:
+        return self.expires_at - self.refresh_margin
+
+    async def get_token(self) -> str:
+        now = time.time()
+        if self.token and now < self.refresh_at:
+            return self.token
+
+        if self.token and now < self.expires_at:
+            # Still valid, so don't make the caller wait for the refresh
+            self._start_refresh(force=False)
+            return self.token
+
+        return await self.refresh()
+
+    async def refresh(self, force: bool = False) -> str:
+        return await asyncio.shield(self._start_refresh(force))
+
+    def start(self):
+        if self._background_task is None or self._background_task.done():
+            self._background_task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self):
+        if self._background_task:
+            self._background_task.cancel()
+            try:
+                await self._background_task
+            except asyncio.CancelledError:
+                pass
+            self._background_task = None
+
+    def _start_refresh(self, force: bool) -> asyncio.Future:
+        # Non-forced refresh may return the rejected token from redis, so a forced one doesn't join it
+        if self._refresh_future is None or (force and not self._refresh_is_forced):
+            future = asyncio.ensure_future(self._refresh(force))
+            future.add_done_callback(self._on_refresh_done)
+            self._refresh_future = future
+            self._refresh_is_forced = force
+
+        return self._refresh_future
+
+    def _on_refresh_done(self, future: asyncio.Future):
+        if self._refresh_future is future:
+            self._refresh_future = None
+        if not future.cancelled() and future.exception():
+            logging.error(f'Error during updating iiko token: {future.exception()}')
+
+    async def _refresh(self, force: bool) -> str:
+        if self.redis is None:
+            return await self._fetch_and_store()
+
+        if not force and await self._load_shared():
+            return self.token
+
+        # Token rejected by iiko is still in redis until someone replaces it
+        stale_token = self.token if force else None
+
+        lock_key = f'{self.redis_key}:lock'
+        if await self.redis.set(lock_key, 1, nx=True, ex=self.lock_timeout):
+            try:
+                return await self._fetch_and_store()
+            finally:
+                await self.redis.delete(lock_key)
+
+        # Another replica is refreshing the token right now, wait for its result
+        deadline = time.time() + self.lock_timeout
+        while time.time() < deadline:
+            await asyncio.sleep(0.5)
+            if await self._load_shared(exclude=stale_token):
+                return self.token
+
+        return await self._fetch_and_store()
+
+    async def _load_shared(self, exclude: str | None = None) -> bool:
+        token, ttl = await asyncio.gather(self.redis.get(self.redis_key), self.redis.ttl(self.redis_key))
+        if not token or ttl <= self.refresh_margin or token.decode() == exclude:
+            return False
+
+        self.token = token.decode()
+        self.expires_at = time.time() + ttl
+        return True
+
+    async def _fetch_and_store(self) -> str:
+        result = await self._fetch_token()
+        self.token = result.token
+        self.expires_at = time.time() + self.lifetime
+
+        if self.redis is not None:
+            await self.redis.set(self.redis_key, self.token, ex=self.lifetime)
+
+        logging.info('Iiko token updated')
+        return self.token
+
+    async def _refresh_loop(self):
+        while True:
+            delay = max(self.refresh_at - time.time(), 0)
+            await asyncio.sleep(delay)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logging.error(f'Background iiko token refresh failed: {e}')
+                await asyncio.sleep(10)
@@ -0,0 +1,110 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import uuid
+
+import aiohttp
+from aiogram.types import InputFile
+
+try:
+    from PIL import Image
+except ImportError:  # Images are sent by link without Pillow
+    Image = None
+
+
+class ImageCache:
+    """
+    Downloads images once, shrinks them to a Telegram-friendly JPEG and keeps them on disk.
+
+    Files are content-addressed (named by sha256 of the processed bytes),
+    redis maps image link to the file hash.
+    """
+
+    def __init__(self, redis, directory: str = 'image_cache', max_side: int = 1280, quality: int = 85,
+                 max_download_size: int = 20 * 1024 * 1024):
+        self.redis = redis
+        self.directory = directory
+        self.max_side = max_side
+        self.quality = quality
+        self.max_download_size = max_download_size
+
+        self._session: aiohttp.ClientSession | None = None
+        self._locks: dict[str, asyncio.Lock] = dict()
+
+        if Image is None:
+            logging.warning('Pillow is not installed, images will be sent by link without caching')
+
+    async def get_file(self, image_link: str) -> InputFile:
+        if Image is None:
+            return InputFile.from_url(image_link)
+
+        try:
+            path = await self.get_path(image_link)
+        except Exception as e:
+            logging.warning(f'Image {image_link} was not cached: {e}')
+            return InputFile.from_url(image_link)
+
+        return InputFile(path)
+
+    async def get_path(self, image_link: str) -> str:
+        lock = self._locks.setdefault(image_link, asyncio.Lock())
+        try:
+            async with lock:
+                digest = await self.redis.get(f'image_cache:{image_link}')
+                if digest:
+                    path = self._get_path(digest.decode())
+                    if os.path.exists(path):
+                        return path
+
+                data = await self._download(image_link)
+                data = await asyncio.to_thread(self._normalize, data)
+                digest = hashlib.sha256(data).hexdigest()
+                path = self._get_path(digest)
+                await asyncio.to_thread(self._write, path, data)
+
+                await self.redis.set(f'image_cache:{image_link}', digest)
+                return path
+        finally:
+            if not lock.locked():
+                self._locks.pop(image_link, None)
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _get_path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], f'{digest}.jpg')
+
+    async def _download(self, image_link: str) -> bytes:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60))
+
+        async with self._session.get(image_link) as response:
+            response.raise_for_status()
+            if (response.content_length or 0) > self.max_download_size:
+                raise ValueError(f'Image is too big: {response.content_length} bytes')
+            return await response.read()
+
+    def _normalize(self, data: bytes) -> bytes:
+        # Only JPEGs are cached, anything that can't be converted is sent by link
+        if Image is None:
+            raise RuntimeError('Pillow is not installed')
+
+        with Image.open(io.BytesIO(data)) as image:
+            image = image.convert('RGB')
+            image.thumbnail((self.max_side, self.max_side))
+            output = io.BytesIO()
+            image.save(output, format='JPEG', quality=self.quality, optimize=True, progressive=True)
+
+        return output.getvalue()
+
+    @staticmethod
+    def _write(path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
@@ -0,0 +1,101 @@
+import uuid
+
+EXTEND_SCRIPT = '''
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+'''
+
+RELEASE_SCRIPT = '''
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+'''
+
+# Writes value only while the lease is held and the fencing token is not older than the last written one
+FENCED_SET_SCRIPT = '''
+if redis.call('get', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+local last_token = tonumber(redis.call('get', KEYS[3]) or '0')
+if tonumber(ARGV[2]) < last_token then
+    return 0
+end
+redis.call('set', KEYS[2], ARGV[3])
+redis.call('set', KEYS[3], ARGV[2])
+if ARGV[4] ~= '' then
+    redis.call('publish', ARGV[4], ARGV[3])
+end
+return 1
+'''
+
+
+class LeaseLostError(RuntimeError):
+    pass
+
+
+class RedisLease:
+    """
+    Lease in redis (SET NX PX) that is held by one process at a time.
+
+    Every acquisition gets a new fencing token, so a writer that lost the lease while it was paused
+    can't overwrite the result of a newer holder.
+    """
+
+    def __init__(self, redis, name: str, ttl: int):
+        self.redis = redis
+        self.name = name
+        self.ttl = ttl
+        self.holder_id = uuid.uuid4().hex
+
+        self.fencing_token: int | None = None
+        self._value: str | None = None
+
+    @property
+    def key(self) -> str:
+        return f'lease:{self.name}'
+
+    @property
+    def fencing_key(self) -> str:
+        return f'lease:{self.name}:fencing'
+
+    async def acquire(self) -> bool:
+        """Takes the lease or extends it if it is already held by this process"""
+        if self._value and await self.redis.eval(EXTEND_SCRIPT, 1, self.key, self._value, self.ttl * 1000):
+            return True
+
+        fencing_token = await self.redis.incr(self.fencing_key)
+        value = f'{self.holder_id}:{fencing_token}'
+        if await self.redis.set(self.key, value, nx=True, px=self.ttl * 1000):
+            self.fencing_token = fencing_token
+            self._value = value
+            return True
+
+        self.fencing_token = None
+        self._value = None
+        return False
+
+    async def is_held(self) -> bool:
+        if not self._value:
+            return False
+
+        value = await self.redis.get(self.key)
+        return value is not None and value.decode() == self._value
+
+    async def release(self):
+        if self._value:
+            await self.redis.eval(RELEASE_SCRIPT, 1, self.key, self._value)
+        self.fencing_token = None
+        self._value = None
+
+    async def set_if_held(self, key: str, value, channel: str = None) -> bool:
+        """Sets key (and publishes value to channel) only if the lease is still held"""
+        if not self._value:
+            return False
+
+        return bool(await self.redis.eval(
+            FENCED_SET_SCRIPT, 3, self.key, key, f'{key}:fencing',
+            self._value, self.fencing_token, value, channel or ''
+        ))
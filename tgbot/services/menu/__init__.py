@@ -0,0 +1,3 @@
+from .snapshot import MenuSnapshot, MenuGroup, MenuProduct
+from .images import ImagePrewarmer
+from .sync import MenuSynchronizer
@@ -0,0 +1,67 @@
+import asyncio
+import logging
+
+from aiogram import Bot
+from aiogram.types import InputFile
+from aiogram.utils import exceptions
+
+from tgbot.services.image_cache import ImageCache
+from tgbot.services.menu.snapshot import MenuSnapshot
+
+
+class ImagePrewarmer:
+    """
+    Uploads menu images to the service chat, so users always get them by cached file_id.
+
+    File ids are stored in redis under the image link, the same way update_message_content does it.
+    """
+
+    def __init__(self, bot: Bot, redis, chat_id: int, concurrency: int = 4, image_cache: ImageCache = None):
+        self.bot = bot
+        self.redis = redis
+        self.chat_id = chat_id
+        self.concurrency = concurrency
+        self.image_cache = image_cache
+
+    @staticmethod
+    def get_image_links(snapshot: MenuSnapshot) -> set[str]:
+        links = {group.image_in_bot or group.image_link for group in snapshot.groups.values()}
+        links.update(product.image_link for product in snapshot.products.values())
+        links.discard(None)
+
+        return links
+
+    async def prewarm(self, snapshot: MenuSnapshot) -> dict:
+        links = list(self.get_image_links(snapshot))
+        file_ids = await self.redis.mget(links) if links else []
+        missing = [link for link, file_id in zip(links, file_ids) if not file_id]
+
+        stats = {'cached': len(links) - len(missing), 'uploaded': 0, 'failed': 0}
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def upload(link):
+            async with semaphore:
+                stats['uploaded' if await self.upload(link) else 'failed'] += 1
+
+        await asyncio.gather(*(upload(link) for link in missing))
+        logging.info(f'Menu images for revision {snapshot.revision} are prewarmed: {stats}')
+        return stats
+
+    async def upload(self, image_link: str) -> bool:
+        photo = await self.image_cache.get_file(image_link) if self.image_cache else InputFile.from_url(image_link)
+        try:
+            message = await self.bot.send_photo(self.chat_id, photo, disable_notification=True)
+        except exceptions.RetryAfter as e:
+            await asyncio.sleep(e.timeout)
+            return await self.upload(image_link)
+        except Exception as e:
+            logging.warning(f'Image {image_link} was not uploaded: {e}')
+            return False
+
+        await self.redis.set(image_link, message.photo[-1].file_id)
+        try:
+            await message.delete()
+        except exceptions.TelegramAPIError:
+            pass
+
+        return True
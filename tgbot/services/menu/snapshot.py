@@ -0,0 +1,112 @@
+from dataclasses import dataclass
+
+from sqlalchemy import select
+from sqlalchemy.orm import noload
+
+from tgbot.services.database.models import Group, Product
+
+
+@dataclass(frozen=True)
+class MenuGroup:
+    id: str
+    name: str
+    image_link: str | None
+    image_in_bot: str | None
+    parent_id: str | None
+    revision: int
+    show_in_bot: bool
+
+
+@dataclass(frozen=True)
+class MenuProduct:
+    id: str
+    name: str
+    description: str | None
+    price: float
+    image_link: str | None
+    group_id: str | None
+    revision: int
+    show_in_bot: bool
+
+
+class MenuSnapshot:
+    """
+    Read-only view of one menu revision with parent/child indexes.
+
+    Never modified after creation: new revision means new snapshot.
+    """
+
+    def __init__(self, revision: int | None, groups: list[MenuGroup], products: list[MenuProduct]):
+        self.revision = revision
+        self.groups: dict[str, MenuGroup] = {group.id: group for group in groups}
+        self.products: dict[str, MenuProduct] = {product.id: product for product in products}
+
+        children = {group_id: [] for group_id in self.groups}
+        group_products = {group_id: [] for group_id in self.groups}
+        root_groups = []
+        for group in groups:
+            if group.parent_id in children:
+                children[group.parent_id].append(group)
+            elif group.parent_id is None and group.show_in_bot:
+                root_groups.append(group)
+        for product in products:
+            if product.group_id in group_products:
+                group_products[product.group_id].append(product)
+
+        self.root_groups: tuple[MenuGroup, ...] = tuple(root_groups)
+        self.children: dict[str, tuple[MenuGroup, ...]] = {
+            group_id: tuple(groups) for group_id, groups in children.items()
+        }
+        self.group_products: dict[str, tuple[MenuProduct, ...]] = {
+            group_id: tuple(products) for group_id, products in group_products.items()
+        }
+
+        # Subgroups are shown when their parent is shown in bot, products are checked one by one
+        self.visible_children: dict[str, tuple[MenuGroup, ...]] = {
+            group_id: groups if self.groups[group_id].show_in_bot else ()
+            for group_id, groups in self.children.items()
+        }
+        self.visible_products: dict[str, tuple[MenuProduct, ...]] = {
+            group_id: tuple(product for product in products if product.show_in_bot)
+            for group_id, products in self.group_products.items()
+        }
+
+    def __eq__(self, other):
+        if not isinstance(other, MenuSnapshot):
+            return NotImplemented
+        return (self.revision, self.groups, self.products) == (other.revision, other.groups, other.products)
+
+    @classmethod
+    async def load(cls, session, revision: int | None) -> 'MenuSnapshot':
+        if revision is None:
+            return cls(None, [], [])
+
+        groups = await session.execute(select(Group).options(noload(Group.parent)).where(Group.revision == revision))
+        products = await session.execute(select(Product).where(Product.revision == revision))
+
+        return cls(
+            revision,
+            [
+                MenuGroup(
+                    id=str(group.id),
+                    name=group.name,
+                    image_link=group.image_link,
+                    image_in_bot=group.image_in_bot,
+                    parent_id=str(group.parent_id) if group.parent_id else None,
+                    revision=group.revision,
+                    show_in_bot=bool(group.show_in_bot)
+                ) for group in groups.scalars()
+            ],
+            [
+                MenuProduct(
+                    id=str(product.id),
+                    name=product.name,
+                    description=product.description,
+                    price=product.price,
+                    image_link=product.image_link,
+                    group_id=str(product.group_id) if product.group_id else None,
+                    revision=product.revision,
+                    show_in_bot=bool(product.show_in_bot)
+                ) for product in products.scalars()
+            ]
+        )
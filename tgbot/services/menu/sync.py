@@ -0,0 +1,136 @@
+import asyncio
+import logging
+
+from tgbot.keyboards.menu_cache import MenuKeyboardCache
+from tgbot.services.iiko.api import Iiko
+from tgbot.services.lease import RedisLease
+from tgbot.services.menu.images import ImagePrewarmer
+from tgbot.services.menu.snapshot import MenuSnapshot
+from tgbot.services.utils import update_menu_from_api
+
+REVISION_CHANNEL = 'menu_revision'
+
+
+class MenuSynchronizer:
+    """
+    Pulls nomenclature from iiko in background and owns the current menu revision.
+
+    Only the replica holding the "menu_sync" lease talks to iiko and writes the menu,
+    others reload their snapshot when the new revision is published.
+    """
+
+    def __init__(self, iiko: Iiko, redis, database, interval: int = 300, prewarmer: ImagePrewarmer = None):
+        self.iiko = iiko
+        self.redis = redis
+        self.database = database
+        self.interval = interval
+        self.prewarmer = prewarmer
+        self.lease = RedisLease(redis, 'menu_sync', ttl=max(interval * 2, 60))
+
+        self.snapshot = MenuSnapshot(None, [], [])
+        self.keyboards = MenuKeyboardCache()
+        self._tasks: list[asyncio.Task] = []
+        self._prewarm_task: asyncio.Task | None = None
+        self._prewarmed_revision: int | None = None
+
+    @property
+    def revision(self) -> int | None:
+        return self.snapshot.revision
+
+    async def load(self):
+        await self.reload(await self._get_shared_revision())
+
+    async def reload(self, revision: int | None):
+        async with self.database() as session:
+            await self._install(await MenuSnapshot.load(session, revision))
+
+    async def sync(self) -> int | None:
+        if not await self.lease.acquire():
+            # Another replica is the leader, just make sure the published revision is not missed
+            await self.reload(await self._get_shared_revision())
+            return self.revision
+
+        async with self.database() as session:
+            revision = await update_menu_from_api(session, self.iiko, self.redis, self.lease, REVISION_CHANNEL)
+            # Rebuilt on every run, so show_in_bot changes made in DB get into bot too
+            await self._install(await MenuSnapshot.load(session, revision))
+
+        if self.prewarmer and revision is not None and revision != self._prewarmed_revision:
+            self._start_prewarm()
+
+        return revision
+
+    async def _get_shared_revision(self) -> int | None:
+        revision = await self.redis.get('revision')
+        return int(revision) if revision else None
+
+    async def _install(self, snapshot: MenuSnapshot):
+        if snapshot == self.snapshot:
+            return
+
+        if snapshot.revision != self.snapshot.revision:
+            logging.info(f'Menu revision changed: {self.snapshot.revision} -> {snapshot.revision}')
+        self.keyboards.warm(snapshot)
+        self.snapshot = snapshot
+
+    def _start_prewarm(self):
+        if self._prewarm_task and not self._prewarm_task.done():
+            return
+
+        self._prewarm_task = asyncio.create_task(self._prewarm(self.snapshot))
+
+    async def _prewarm(self, snapshot: MenuSnapshot):
+        try:
+            stats = await self.prewarmer.prewarm(snapshot)
+        except Exception as e:
+            logging.exception(f'Menu images prewarm failed: {e}')
+        else:
+            # Failed images are retried on the next sync
+            if not stats['failed']:
+                self._prewarmed_revision = snapshot.revision
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._sync_loop()),
+                asyncio.create_task(self._listen_revisions())
+            ]
+
+    async def close(self):
+        tasks = [*self._tasks, self._prewarm_task] if self._prewarm_task else self._tasks
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._prewarm_task = None
+
+        await self.lease.release()
+
+    async def _sync_loop(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logging.exception(f'Menu synchronization failed: {e}')
+
+            await asyncio.sleep(self.interval)
+
+    async def _listen_revisions(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(REVISION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message['type'] != 'message':
+                        continue
+
+                    revision = int(message['data'])
+                    if revision != self.revision:
+                        await self.reload(revision)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.exception(f'Menu revision listener failed: {e}')
+                await asyncio.sleep(5)
+            finally:
+                await pubsub.reset()
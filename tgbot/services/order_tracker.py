@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.utils import exceptions
+
+from tgbot.misc import messages
+from tgbot.services.iiko.api import Iiko
+from tgbot.services.iiko.schemas import DeliveryInfo
+from tgbot.services.lease import RedisLease
+from tgbot.services.rate_limiter import TokenBucket
+
+FINAL_STATUSES = ('Delivered', 'Closed', 'Cancelled', 'Error')
+ORDER_TTL = 2 * 24 * 60 * 60  # Forgotten orders are dropped from tracking after this time
+
+
+class OrderTracker:
+    """
+    Follows open iiko orders and tells users when the status changes.
+
+    Open orders are kept in redis per organization and requested from iiko in batches,
+    only the replica holding the "order_tracker" lease polls.
+    """
+
+    def __init__(self, iiko: Iiko, redis, bot: Bot, interval: int = 60, batch_size: int = 200,
+                 rate_limiter: TokenBucket = None):
+        self.iiko = iiko
+        self.redis = redis
+        self.bot = bot
+        self.interval = interval
+        self.batch_size = batch_size
+        self.rate_limiter = rate_limiter or TokenBucket(20)
+        self.lease = RedisLease(redis, 'order_tracker', ttl=max(interval * 2, 60))
+
+        self.stats = {'open_orders': 0, 'requests': 0, 'poll_latency': 0.0, 'notifications': 0, 'queue': 0}
+        self._queue: asyncio.Queue[tuple[int, str]] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+
+    async def track(self, organization_id: str, order_id: str, telegram_id: int):
+        order_key = f'order_tracker:order:{order_id}'
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.sadd('order_tracker:organizations', organization_id)
+            pipe.sadd(f'order_tracker:{organization_id}', order_id)
+            pipe.hset(order_key, mapping={'telegram_id': telegram_id, 'status': ''})
+            pipe.expire(order_key, ORDER_TTL)
+            await pipe.execute()
+
+    async def poll(self):
+        started = time.monotonic()
+        open_orders = requests = 0
+
+        for organization_id in await self.redis.smembers('order_tracker:organizations'):
+            organization_id = organization_id.decode()
+            order_ids = [order_id.decode() for order_id in await self.redis.smembers(f'order_tracker:{organization_id}')]
+            open_orders += len(order_ids)
+
+            for i in range(0, len(order_ids), self.batch_size):
+                chunk = order_ids[i:i + self.batch_size]
+                result = await self.iiko.get_deliveries_by_id(organization_id, chunk)
+                requests += 1
+
+                for info in result.orders:
+                    await self._update(organization_id, info)
+
+                missing = set(chunk) - {info.id for info in result.orders}
+                for order_id in missing:
+                    if not await self.redis.exists(f'order_tracker:order:{order_id}'):
+                        await self.redis.srem(f'order_tracker:{organization_id}', order_id)
+
+        self.stats.update(
+            open_orders=open_orders,
+            requests=self.stats['requests'] + requests,
+            poll_latency=round(time.monotonic() - started, 3),
+            queue=self._queue.qsize()
+        )
+        logging.info(f'Order statuses are polled: {self.stats}')
+
+    async def _update(self, organization_id: str, info: DeliveryInfo):
+        if info.creationStatus == 'Error':
+            status = 'Error'
+        elif info.order:
+            status = info.order.status
+        else:
+            return  # Still being created
+
+        order_key = f'order_tracker:order:{info.id}'
+        telegram_id, old_status = await self.redis.hmget(order_key, 'telegram_id', 'status')
+        if telegram_id is None or (old_status or b'').decode() == status:
+            return
+
+        if status in FINAL_STATUSES:
+            await self.redis.srem(f'order_tracker:{organization_id}', info.id)
+            await self.redis.delete(order_key)
+        else:
+            await self.redis.hset(order_key, 'status', status)
+
+        if text := messages.order_statuses.get(status):
+            self._queue.put_nowait((int(telegram_id), text))
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._poll_loop()),
+                asyncio.create_task(self._send_loop())
+            ]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        await self.lease.release()
+
+    async def _poll_loop(self):
+        while True:
+            try:
+                if await self.lease.acquire():
+                    await self.poll()
+            except Exception as e:
+                logging.exception(f'Order statuses polling failed: {e}')
+
+            await asyncio.sleep(self.interval)
+
+    async def _send_loop(self):
+        while True:
+            telegram_id, text = await self._queue.get()
+            await self.rate_limiter.acquire()
+            try:
+                await self.bot.send_message(telegram_id, text)
+                self.stats['notifications'] += 1
+            except exceptions.RetryAfter as e:
+                self.rate_limiter.pause(e.timeout)
+                self._queue.put_nowait((telegram_id, text))
+            except Exception as e:
+                logging.warning(f'Order status was not sent to {telegram_id}: {e}')
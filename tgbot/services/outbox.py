@@ -0,0 +1,122 @@
+import asyncio
+import datetime
+import logging
+
+from aiogram import Bot
+
+from tgbot.services.database.models import OrderOutbox
+from tgbot.services.iiko.api import Iiko
+from tgbot.services.iiko.schemas import DeliveryCreate, CreateReserveRequest
+from tgbot.services.order_tracker import OrderTracker
+
+
+class OutboxWorker:
+    """
+    Submits orders and reserves from the outbox table to iiko.
+
+    Every request carries its own id, so iiko doesn't create a duplicate when the
+    request is sent again after a crash or a lost response.
+    """
+
+    def __init__(self, iiko: Iiko, database, bot: Bot = None, admin_ids: list[int] = None, interval: float = 5,
+                 batch_size: int = 10, max_attempts: int = 10, max_delay: int = 30 * 60, tracker: OrderTracker = None):
+        self.iiko = iiko
+        self.database = database
+        self.bot = bot
+        self.admin_ids = admin_ids or []
+        self.tracker = tracker
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.max_delay = max_delay
+
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def process(self) -> int:
+        """Submits one batch of due records, returns their count"""
+        async with self.database() as session:
+            records = await OrderOutbox.get_due(session, self.batch_size)
+            failed = list()
+            for record in records:
+                if not await self._submit(record) and record.status == 'failed':
+                    failed.append(record)
+
+            await session.commit()
+
+        for record in failed:
+            await self._notify_admins(record)
+
+        return len(records)
+
+    async def _submit(self, record: OrderOutbox) -> bool:
+        record.attempts += 1
+        try:
+            if record.kind == 'delivery':
+                await self.iiko.create_delivery(DeliveryCreate(**record.payload))
+            elif record.kind == 'reserve':
+                await self.iiko.create_reserve(CreateReserveRequest(**record.payload))
+            else:
+                raise ValueError(f'Unknown outbox kind "{record.kind}"')
+        except Exception as e:
+            record.last_error = repr(e)
+            if record.attempts >= self.max_attempts:
+                record.status = 'failed'
+                logging.error(f'Outbox {record.kind} {record.id} failed after {record.attempts} attempts: {e}')
+            else:
+                delay = min(2 ** record.attempts * self.interval, self.max_delay)
+                record.next_attempt_at = datetime.datetime.now() + datetime.timedelta(seconds=delay)
+                logging.warning(f'Outbox {record.kind} {record.id} attempt {record.attempts} failed: {e}')
+            return False
+
+        record.status = 'sent'
+        record.sent_at = datetime.datetime.now()
+        record.last_error = None
+
+        if record.kind == 'delivery':
+            await self._track(record)
+        return True
+
+    async def _track(self, record: OrderOutbox):
+        # iiko already has the order, so a tracking failure must not send it again
+        if not self.tracker or not record.telegram_id:
+            return
+
+        try:
+            request = DeliveryCreate(**record.payload)
+            await self.tracker.track(request.organizationId, request.order.id, record.telegram_id)
+        except Exception as e:
+            logging.warning(f'Outbox {record.kind} {record.id} is sent but not tracked: {e}')
+
+    async def _notify_admins(self, record: OrderOutbox):
+        if not self.bot:
+            return
+
+        text = (f'Не удалось передать в iiko {record.kind} #{record.id} '
+                f'(пользователь {record.telegram_id}): {record.last_error}')
+        for admin_id in self.admin_ids:
+            try:
+                await self.bot.send_message(admin_id, text, parse_mode=None)
+            except Exception as e:
+                logging.warning(f'Admin {admin_id} was not notified about outbox {record.id}: {e}')
+
+    async def _loop(self):
+        while True:
+            try:
+                count = await self.process()
+            except Exception as e:
+                logging.exception(f'Outbox processing failed: {e}')
+                count = 0
+
+            # Full batch means there may be more due records
+            if count < self.batch_size:
+                await asyncio.sleep(self.interval)
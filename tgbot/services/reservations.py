@@ -0,0 +1,215 @@
+import asyncio
+import bisect
+import datetime
+import logging
+import time
+from dataclasses import dataclass, field
+
+from tgbot.services.iiko.api import Iiko
+from tgbot.services.iiko.schemas import Reserve, RestaurantSection, TablesResult
+
+RESERVE_DURATION = 120  # Minutes
+
+
+class TableOccupancy:
+    """Busy intervals of every table, merged and sorted by start"""
+
+    def __init__(self, table_ids: list[str], reserves: list[Reserve]):
+        self.table_ids = table_ids
+        self._starts: dict[str, list[datetime.datetime]] = dict()
+        self._ends: dict[str, list[datetime.datetime]] = dict()
+
+        intervals: dict[str, list[tuple[datetime.datetime, datetime.datetime]]] = {table_id: [] for table_id in table_ids}
+        for reserve in reserves:
+            start = datetime.datetime.fromisoformat(reserve.estimatedStartTime)
+            end = start + datetime.timedelta(minutes=reserve.durationInMinutes)
+            for table_id in reserve.tableIds:
+                intervals.setdefault(str(table_id), []).append((start, end))
+
+        for table_id, table_intervals in intervals.items():
+            self._set_intervals(table_id, table_intervals)
+
+    def is_free(self, table_id: str, start: datetime.datetime, end: datetime.datetime) -> bool:
+        starts = self._starts.get(table_id, [])
+        # The last interval starting before `end` is the only one that may overlap
+        ind = bisect.bisect_left(starts, end) - 1
+        return ind < 0 or self._ends[table_id][ind] <= start
+
+    def get_free_table(self, start: datetime.datetime, duration: int = RESERVE_DURATION) -> str | None:
+        end = start + datetime.timedelta(minutes=duration)
+        return next((table_id for table_id in self.table_ids if self.is_free(table_id, start, end)), None)
+
+    def get_free_slots(self, slots: list[datetime.datetime], duration: int = RESERVE_DURATION) -> list[datetime.datetime]:
+        return [slot for slot in slots if self.get_free_table(slot, duration) is not None]
+
+    def book(self, table_id: str, start: datetime.datetime, duration: int = RESERVE_DURATION):
+        end = start + datetime.timedelta(minutes=duration)
+        intervals = list(zip(self._starts.get(table_id, []), self._ends.get(table_id, [])))
+        self._set_intervals(table_id, intervals + [(start, end)])
+
+    def _set_intervals(self, table_id: str, intervals: list[tuple[datetime.datetime, datetime.datetime]]):
+        merged = list()
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+
+        self._starts[table_id] = [start for start, _ in merged]
+        self._ends[table_id] = [end for _, end in merged]
+
+
+@dataclass
+class TableLayout:
+    terminal_group_id: str
+    revision: int | None = None
+    sections: dict[str, RestaurantSection] = field(default_factory=dict)
+
+    @property
+    def section_ids(self) -> list[str]:
+        return list(self.sections)
+
+    @property
+    def table_ids(self) -> list[str]:
+        return [str(table.id) for section in self.sections.values() for table in section.tables]
+
+    def merge(self, tables: TablesResult):
+        """Applies full result or delta since `revision`: changed tables replace old ones, deleted are dropped"""
+        for section in tables.restaurantSections:
+            section_id = str(section.id)
+            old_section = self.sections.get(section_id)
+            section_tables = {str(table.id): table for table in old_section.tables} if old_section else dict()
+            section_tables.update({str(table.id): table for table in section.tables})
+
+            self.sections[section_id] = section.model_copy(
+                update={'tables': [table for table in section_tables.values() if not table.isDeleted]}
+            )
+
+        self.revision = tables.revision
+
+
+class TableLayoutCache:
+    """
+    Terminal groups and tables of every organization.
+
+    Layouts are refreshed in background with revision deltas, the reservation flow only reads them.
+    """
+
+    def __init__(self, iiko: Iiko, interval: int = 10 * 60):
+        self.iiko = iiko
+        self.interval = interval
+
+        self._layouts: dict[str, TableLayout] = dict()
+        self._locks: dict[str, asyncio.Lock] = dict()
+        self._task: asyncio.Task | None = None
+
+    async def get(self, organization_id: str) -> TableLayout:
+        layout = self._layouts.get(organization_id)
+        if layout is None:
+            # Organization was not known at the last refresh
+            layout = await self.refresh(organization_id)
+
+        return layout
+
+    async def refresh(self, organization_id: str) -> TableLayout:
+        async with self._locks.setdefault(organization_id, asyncio.Lock()):
+            terminal_groups = await self.iiko.get_terminal_groups([organization_id])
+            terminal_group_id = str(terminal_groups.terminalGroups[0].items[0].id)
+
+            layout = self._layouts.get(organization_id)
+            if layout is None or layout.terminal_group_id != terminal_group_id:
+                layout = TableLayout(terminal_group_id)
+
+            tables = await self.iiko.get_available_tables([terminal_group_id], False, layout.revision)
+            if tables.revision != layout.revision:
+                layout.merge(tables)
+
+            self._layouts[organization_id] = layout
+            return layout
+
+    async def refresh_all(self):
+        organizations = await self.iiko.get_organizations(False, False)
+        organization_ids = {str(org.id) for org in organizations.organizations} | set(self._layouts)
+
+        for organization_id in organization_ids:
+            try:
+                await self.refresh(organization_id)
+            except Exception as e:
+                logging.warning(f'Tables of organization {organization_id} were not refreshed: {e}')
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.refresh_all()
+            except Exception as e:
+                logging.exception(f'Tables refresh failed: {e}')
+
+            await asyncio.sleep(self.interval)
+
+
+@dataclass
+class DayAvailability:
+    terminal_group_id: str
+    occupancy: TableOccupancy
+
+
+class ReservationPlanner:
+    """
+    Loads tables occupancy for a whole day with one get_reserves request.
+
+    Days are kept for `ttl` seconds, so the time keyboard and the chosen slot use the same data.
+    """
+
+    def __init__(self, iiko: Iiko, layouts: TableLayoutCache, ttl: int = 60):
+        self.iiko = iiko
+        self.layouts = layouts
+        self.ttl = ttl
+
+        self._days: dict[tuple[str, datetime.date], tuple[float, DayAvailability]] = dict()
+        self._locks: dict[tuple[str, datetime.date], asyncio.Lock] = dict()
+
+    async def get_day(self, organization_id: str, date: datetime.date) -> DayAvailability:
+        key = (organization_id, date)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                cached = self._days.get(key)
+                if cached and time.monotonic() < cached[0]:
+                    return cached[1]
+
+                day = await self._load_day(organization_id, date)
+                self._days[key] = (time.monotonic() + self.ttl, day)
+                self._drop_expired()
+                return day
+        finally:
+            if not lock.locked():
+                self._locks.pop(key, None)
+
+    async def _load_day(self, organization_id: str, date: datetime.date) -> DayAvailability:
+        layout = await self.layouts.get(organization_id)
+
+        # Reserves from the previous evening may still take tables in the morning
+        date_from = datetime.datetime.combine(date, datetime.time()) - datetime.timedelta(minutes=RESERVE_DURATION)
+        date_to = datetime.datetime.combine(date, datetime.time()) + datetime.timedelta(days=1)
+        reserves = await self.iiko.get_reserves(
+            layout.section_ids,
+            date_from.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+            date_to.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+        )
+
+        return DayAvailability(layout.terminal_group_id, TableOccupancy(layout.table_ids, reserves.reserves))
+
+    def _drop_expired(self):
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _) in self._days.items() if expires_at <= now]:
+            del self._days[key]
@@ -1,13 +1,21 @@
+import logging
 import re
+import time
+import uuid
 from datetime import datetime, timedelta
 from pprint import pprint
 
 from aiogram.types import InputFile, InputMediaPhoto
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
 
 from tgbot.services.database.models import Organization, IikoUser
 from tgbot.services.database.models.group import Group
 from tgbot.services.database.models.product import Product
 from tgbot.services.iiko.api import Iiko
+from tgbot.services.lease import RedisLease, LeaseLostError
+
+UPSERT_CHUNK_SIZE = 1000
 
 
 def contains_only_russian_letters(input_string):
@@ -53,7 +61,63 @@ async def update_user_from_api(session, iiko: Iiko, user_id) -> IikoUser:
     return db_user
 
 
-async def update_menu_from_api(session, iiko, redis):
+def _get_image_link(item) -> str | None:
+    return item.imageLinks[0] if item.imageLinks and 'http' in item.imageLinks[0] else None
+
+
+def _sort_groups_by_depth(groups: dict) -> list[dict]:
+    """Parents go before children, so chunked inserts never break the parent_id foreign key"""
+    depths = dict()
+
+    def get_depth(group_id):
+        if group_id not in depths:
+            parent_id = groups[group_id]['parent_id']
+            depths[group_id] = get_depth(parent_id) + 1 if parent_id in groups else 0
+        return depths[group_id]
+
+    return sorted(groups.values(), key=lambda group: get_depth(group['id']))
+
+
+def _comparable(value):
+    # UUID columns are read as uuid.UUID, while iiko sends ids as strings
+    return str(value) if isinstance(value, uuid.UUID) else value
+
+
+async def bulk_upsert(session, model, rows: list[dict], compared_columns: tuple[str, ...],
+                      chunk_size: int = UPSERT_CHUNK_SIZE) -> dict:
+    stats = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+    update_columns = [column for column in rows[0] if column != 'id'] if rows else []
+
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+
+        stmt = select(model.id, *(getattr(model, column) for column in compared_columns)).where(
+            model.id.in_([row['id'] for row in chunk])
+        )
+        existing = {
+            str(record[0]): tuple(_comparable(value) for value in record[1:])
+            for record in await session.execute(stmt)
+        }
+        for row in chunk:
+            old_values = existing.get(str(row['id']))
+            if old_values is None:
+                stats['inserted'] += 1
+            elif old_values != tuple(_comparable(row[column]) for column in compared_columns):
+                stats['updated'] += 1
+            else:
+                stats['unchanged'] += 1
+
+        stmt = insert(model).values(chunk)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[model.id],
+            set_={column: stmt.excluded[column] for column in update_columns}
+        )
+        await session.execute(stmt)
+
+    return stats
+
+
+async def update_menu_from_api(session, iiko, redis, lease: RedisLease = None, channel: str = None):
     revision = await redis.get('revision')
     revision = int(revision) if revision else None
 
@@ -61,85 +125,86 @@ async def update_menu_from_api(session, iiko, redis):
     if not menu.products:
         return revision
 
-    added_groups = set()
+    started_at = time.perf_counter()
+
+    groups = dict()
     for group in menu.groups:
         if group.isDeleted or not group.isIncludedInMenu or group.isGroupModifier:
             continue
 
-        db_group = await session.get(Group, group.id)
-        if db_group:
-            db_group.image_link = group.imageLinks[0] if group.imageLinks and 'http' in group.imageLinks[0] else None
-            db_group.name = group.name
-            db_group.revision = menu.revision
-            db_group.parent_id = group.parentGroup
-        else:
-
-            new_group = Group(
-                id=group.id,
-                image_link=group.imageLinks[0] if group.imageLinks and 'http' in group.imageLinks[0] else None,
-                name=group.name,
-                revision=menu.revision,
-                parent_id=group.parentGroup
-            )
-            session.add(new_group)
-        added_groups.add(group.id)
+        groups[group.id] = dict(
+            id=group.id,
+            image_link=_get_image_link(group),
+            name=group.name,
+            revision=menu.revision,
+            parent_id=group.parentGroup
+        )
 
     added = set()
-    bad_groups = set()
+    products = dict()
     for product in menu.products:
         if product.isDeleted or product.type != 'Dish' or product.code in added:
             continue
 
-        if product.groupId in added_groups:
-            group_id = product.groupId
-        else:
-            bad_groups.add(product.groupId)
-            group_id = product.parentGroup
-
-        db_product = await session.get(Product, product.id)
-        if db_product:
-            db_product.image_link = product.imageLinks[0] if product.imageLinks and 'http' in product.imageLinks[0] else None
-            db_product.name = product.name
-            db_product.description = product.description
-            db_product.price = product.sizePrices[0].price.currentPrice
-            db_product.revision = menu.revision
-            db_product.group_id = group_id
-        else:
-            new_product = Product(
-                id=product.id,
-                image_link=product.imageLinks[0] if product.imageLinks and 'http' in product.imageLinks[0] else None,
-                name=product.name,
-                description=product.description,
-                price=product.sizePrices[0].price.currentPrice,
-                revision=menu.revision,
-                group_id=group_id
-            )
-            session.add(new_product)
+        products[product.id] = dict(
+            id=product.id,
+            image_link=_get_image_link(product),
+            name=product.name,
+            description=product.description,
+            price=product.sizePrices[0].price.currentPrice,
+            revision=menu.revision,
+            group_id=product.groupId if product.groupId in groups else product.parentGroup
+        )
         added.add(product.code)
 
-    await session.commit()
-    await redis.set('revision', menu.revision)
+    groups_stats = await bulk_upsert(session, Group, _sort_groups_by_depth(groups),
+                                     ('image_link', 'name', 'parent_id'))
+    products_stats = await bulk_upsert(session, Product, list(products.values()),
+                                       ('image_link', 'name', 'description', 'price', 'group_id'))
+
+    if lease is None:
+        await session.commit()
+        await redis.set('revision', menu.revision)
+    else:
+        if not await lease.is_held():
+            await session.rollback()
+            raise LeaseLostError(f'Lease "{lease.name}" was lost before menu revision {menu.revision} was saved')
+
+        await session.commit()
+        if not await lease.set_if_held('revision', menu.revision, channel):
+            raise LeaseLostError(f'Lease "{lease.name}" was lost before menu revision {menu.revision} was published')
+
+    logging.info(f'Menu revision {menu.revision} saved in {time.perf_counter() - started_at:.3f}s. '
+                 f'Groups: {groups_stats}. Products: {products_stats}')
     return menu.revision
 
 
+async def get_photo(bot, redis, image_link):
+    """Returns cached file_id or file to upload"""
+    photo_id = await redis.get(image_link)
+    if photo_id:
+        return photo_id.decode()
+
+    image_cache = bot.get('image_cache')
+    return await image_cache.get_file(image_link) if image_cache else InputFile.from_url(image_link)
+
+
 async def update_message_content(call, redis, text, keyboard, image_link):
     if call.message.photo:
         if image_link:
-            photo_id = await redis.get(image_link)
-            photo = photo_id.decode() if photo_id else InputFile.from_url(image_link)
+            photo = await get_photo(call.bot, redis, image_link)
             msg = await call.message.edit_media(InputMediaPhoto(photo, caption=text), reply_markup=keyboard)
-            if not photo_id:
+            if isinstance(photo, InputFile):
                 await redis.set(image_link, msg.photo[-1].file_id)
         else:
             await call.message.delete()
             await call.message.answer(text, reply_markup=keyboard)
     else:
         if image_link:
-            photo_id = await redis.get(image_link)
-            photo = photo_id.decode() if photo_id else InputFile.from_url(image_link)
+            photo = await get_photo(call.bot, redis, image_link)
             msg = await call.message.answer_photo(photo, caption=text, reply_markup=keyboard)
             await call.message.delete()
-            if not photo_id:
+            if isinstance(photo, InputFile):
                 await redis.set(image_link, msg.photo[-1].file_id)
         else:
             await call.message.edit_text(text, reply_markup=keyboard)
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import uuid
+
+import aiohttp
+
+from tgbot.services.yookassa import schemas
+
+
+class YooKassa:
+    """Async client for YooKassa REST API, doesn't block the event loop unlike the official sdk"""
+
+    def __init__(self, store_id, secret_key, retries_count: int = 3, request_timeout: float = 15):
+        self.store_id = store_id
+        self.secret_key = secret_key
+        self.retries_count = retries_count
+        self.request_timeout = request_timeout
+
+        self.base_url = 'https://api.yookassa.ru/v3'
+        self._session: aiohttp.ClientSession | None = None
+
+    async def create_payment(
+            self,
+            value: float,
+            description: str,
+            return_url: str,
+            metadata: dict = None,
+            idempotence_key: str = None
+    ) -> schemas.Payment:
+        payload = {
+            'amount': {
+                'value': f'{value:.2f}',
+                'currency': 'RUB'
+            },
+            'confirmation': {
+                'type': 'redirect',
+                'return_url': return_url
+            },
+            'capture': True,
+            'description': description,
+            'metadata': metadata
+        }
+
+        result = await self._request('POST', '/payments', idempotence_key or str(uuid.uuid4()), json=payload)
+        return schemas.Payment(**result)
+
+    async def get_payment(self, payment_id: str) -> schemas.Payment:
+        result = await self._request('GET', f'/payments/{payment_id}')
+        return schemas.Payment(**result)
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                auth=aiohttp.BasicAuth(str(self.store_id), self.secret_key),
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout)
+            )
+
+        return self._session
+
+    async def _request(self, method, path, idempotence_key: str = None, retries=1, **kwargs):
+        # The same idempotence key is sent on retries, so a payment is never created twice
+        headers = {'Idempotence-Key': idempotence_key} if idempotence_key else {}
+
+        session = self._get_session()
+        try:
+            async with session.request(method, self.base_url + path, headers=headers, **kwargs) as response:
+                if response.ok:
+                    return await response.json()
+
+                status, text = response.status, await response.text()
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            status, text = None, repr(e)
+
+        if retries >= self.retries_count or (status is not None and status < 500):
+            raise schemas.ApiError(f'{status}, {text}')
+
+        logging.warning(f'YooKassa request {method} {path} failed: {status}, {text}. Retrying')
+        await asyncio.sleep(retries)
+        return await self._request(method, path, idempotence_key, retries + 1, **kwargs)
@@ -0,0 +1,30 @@
+from typing import Any
+
+from pydantic import BaseModel
+
+
+class ApiError(Exception):
+    pass
+
+
+class Amount(BaseModel):
+    value: float
+    currency: str
+
+
+class Confirmation(BaseModel):
+    type: str
+    confirmation_url: str | None = None
+    return_url: str | None = None
+
+
+class Payment(BaseModel):
+    id: str
+    status: str  # "pending" "waiting_for_capture" "succeeded" "canceled"
+    paid: bool
+    amount: Amount
+    description: str | None = None
+    confirmation: Confirmation | None = None
+    metadata: dict[str, Any] | None = None
+    created_at: str | None = None
+    test: bool | None = None
@@ -0,0 +1,71 @@
+import logging
+from typing import Awaitable, Callable
+
+from aiohttp import web
+
+from tgbot.services.yookassa.api import YooKassa
+from tgbot.services.yookassa.schemas import ApiError, Payment
+
+EVENTS = ('payment.succeeded', 'payment.canceled')
+
+
+class YooKassaWebhook:
+    """
+    HTTP endpoint for YooKassa notifications.
+
+    Notifications are not signed, so the payment from the request body is never trusted:
+    its status is requested from API and only then passed to `on_payment`.
+    """
+
+    def __init__(self, yookassa: YooKassa, on_payment: Callable[[Payment], Awaitable],
+                 host: str = '0.0.0.0', port: int = 8080, path: str = '/yookassa'):
+        self.yookassa = yookassa
+        self.on_payment = on_payment
+        self.host = host
+        self.port = port
+        self.path = path
+
+        self._runner: web.AppRunner | None = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logging.info(f'YooKassa webhook is listening on {self.host}:{self.port}{self.path}')
+
+    async def close(self):
+        if self._runner:
+            await self._runner.cleanup()
+        self._runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        try:
+            data = await request.json()
+            event, payment_id = data['event'], data['object']['id']
+        except (ValueError, KeyError, TypeError):
+            return web.Response(status=400)
+
+        if event not in EVENTS:
+            return web.Response()
+
+        try:
+            payment = await self.yookassa.get_payment(payment_id)
+        except ApiError as e:
+            logging.error(f'Payment {payment_id} from notification was not checked: {e}')
+            # YooKassa will send the notification again
+            return web.Response(status=500)
+
+        if payment.status not in ('succeeded', 'canceled'):
+            logging.warning(f'Notification {event} for payment {payment_id} in status {payment.status}')
+            return web.Response()
+
+        try:
+            await self.on_payment(payment)
+        except Exception as e:
+            logging.exception(f'Payment {payment_id} notification was not processed: {e}')
+            return web.Response(status=500)
+
+        return web.Response()